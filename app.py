@@ -1,13 +1,30 @@
-from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, send_file, session, redirect, url_for, stream_with_context
 import os
 import json
-from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
+import hmac
+import hashlib
+import tempfile
 from pdf_corrector_module import PDFCorrector
+from async_pdf_corrector import AsyncPDFCorrector
 from config import Config
+from excel_export import EXCEL_MEDIA_TYPE, write_corrections_excel
+from job_queue import JobQueue
+from pipeline_metrics import registry as metrics_registry
+from revision_store import RevisionStore
+from upload_ingest import IngestRequest, UploadRejected, inspect_pdf
+from werkzeug.exceptions import RequestEntityTooLarge
 
 app = Flask(__name__)
 app.secret_key = Config.SECRET_KEY
+# アップロードは受信しながらUPLOAD_FOLDERに書き込み、上限を超えたリクエストは途中で打ち切る
+app.request_class = IngestRequest
+app.config['MAX_CONTENT_LENGTH'] = Config.MAX_CONTENT_LENGTH
+
+# 校正ジョブのワーカープール
+job_queue = JobQueue(Config.JOB_WORKERS, Config.JOB_FOLDER, Config.JOB_RETENTION_SECONDS, Config.JOB_STALE_SECONDS)
+
+# 差分校正用の改訂履歴
+revision_store = RevisionStore(Config.REVISION_FOLDER)
 
 
 def login_required(f):
@@ -38,6 +55,20 @@ def logout():
     session.pop('logged_in', None)
     return redirect(url_for('login'))
 
+@app.route('/metrics')
+def metrics():
+    """
+    処理時間・トークン数などの計測値をPrometheus形式で出力（このプロセスの集計）
+    ログイン済みのセッションか、METRICS_TOKENを設定した場合は「Authorization: Bearer <トークン>」で参照できる
+    """
+    if not Config.METRICS_ENABLED:
+        return jsonify({'error': 'メトリクスは無効です'}), 404
+    if 'logged_in' not in session:
+        token = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not Config.METRICS_TOKEN or not hmac.compare_digest(token.encode('utf-8'), Config.METRICS_TOKEN.encode('utf-8')):
+            return jsonify({'error': '認証が必要です'}), 401
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/robots.txt')
 def robots_txt():
     return send_file('static/robots.txt', mimetype='text/plain')
@@ -47,6 +78,66 @@ def robots_txt():
 def index():
     return render_template('index.html')
 
+def upload_key(content_hash, document_key=None):
+    """
+    アップロードされたPDFの保存名と重複排除に使うキー
+    内容のSHA-256に、結果が変わる条件（モデル・プロンプトのバージョン・指定された文書ID）を加えたハッシュ
+    """
+    key = f"{content_hash}\n{Config.BEDROCK_MODEL_ID}\n{Config.PROMPT_TEMPLATE_VERSION}\n{document_key or ''}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+@app.teardown_request
+def discard_uploads(exception=None):
+    """保存先に移動しなかった受信ファイル（拒否・合流したアップロード）を削除"""
+    if isinstance(request, IngestRequest):
+        request.discard_uploads()
+
+def job_excel_filename(job_id):
+    """ジョブの校正結果のエクセルのファイル名（ジョブごとに一意）"""
+    return f"校正結果_{job_id}.xlsx"
+
+def run_correction_job(job_id, filepath, document_key=None, progress_callback=None, event_callback=None):
+    """PDF校正処理の実行（ジョブワーカー内で実行）"""
+    def result_callback(stage, correction):
+        """ページごとの結果をイベントとして通知"""
+        event_callback('result', {'stage': stage, 'correction': correction})
+    
+    def delta_callback(stage, page, text):
+        """生成途中の結果をイベントとして通知"""
+        event_callback('delta', {'stage': stage, 'page': page, 'text': text})
+    
+    try:
+        # PDF校正処理（テキスト分析・画像分析・統合）
+        corrector = AsyncPDFCorrector() if Config.ASYNC_PIPELINE_ENABLED else PDFCorrector()
+        corrections = corrector.run_pipeline(
+            filepath,
+            progress_callback=progress_callback,
+            result_callback=result_callback if event_callback else None,
+            revision_store=revision_store,
+            document_key=document_key,
+            delta_callback=delta_callback if event_callback else None
+        )
+        
+        # エクセル出力（同時に完了した別のジョブと衝突しないようジョブIDをファイル名に含める）
+        excel_filename = job_excel_filename(job_id)
+        excel_path = os.path.join(Config.OUTPUT_FOLDER, excel_filename)
+        os.makedirs(Config.OUTPUT_FOLDER, exist_ok=True)
+        
+        corrector.export_to_excel(excel_path)
+        
+        page_limit = f'最大{Config.MAX_PDF_PAGES}ページまで処理' if Config.MAX_PDF_PAGES > 0 else '全ページを処理'
+        return {
+            'corrections': corrections,
+            'excel_file': excel_filename,
+            'max_pages': Config.MAX_PDF_PAGES,
+            'timings': corrector.metrics.summary(),
+            'message': f'PDF校正が完了しました（テキスト分析+画像分析の統合結果、{page_limit}）'
+        }
+    finally:
+        # 一時ファイル削除
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
 @app.route('/upload', methods=['POST'])
 @login_required
 def upload_file():
@@ -59,68 +150,137 @@ def upload_file():
             return jsonify({'error': 'ファイルが選択されていません'}), 400
         
         if file and file.filename.lower().endswith('.pdf'):
-            # 一時ファイルとして保存
-            filename = f"temp_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-            filepath = os.path.join('uploads', filename)
-            os.makedirs('uploads', exist_ok=True)
-            file.save(filepath)
-            
-            # PDF校正処理（テキスト分析と画像分析を並列実行）
-            corrector = PDFCorrector()
+            # 受信済みのファイル（一意な名前で保存済み）がPDFとして処理できるか確認する
+            upload = file.stream
+            upload.close()
+            inspect_pdf(upload.path, Config.UPLOAD_MAX_PAGES)
             
-            # 並列処理でテキスト分析と画像分析を同時実行
-            text_corrections = []
-            image_corrections = []
+            # 同じ文書の改訂版は前回の結果を再利用する（文書IDの指定がなければファイル名で識別）
+            document_key = None
+            if Config.INCREMENTAL_PROOFING_ENABLED:
+                document_key = request.form.get('document_id') or file.filename
             
-            def run_text_analysis():
-                """テキスト分析の実行"""
-                return corrector.process_pdf(filepath)
+            # 同じ内容のPDFが処理中・処理済みの場合はそのジョブに合流する（キーがなければ常に新しいジョブ）
+            # ファイル名は合流の判定に使わず、明示的に指定された文書IDのみ区別する
+            key = upload_key(upload.sha256, request.form.get('document_id')) if Config.UPLOAD_DEDUP_ENABLED else None
+            job_id, created = job_queue.reserve(key)
             
-            def run_image_analysis():
-                """画像分析の実行"""
-                return corrector.run_image_analysis(filepath)
-            
-            # 並列処理
-            with ThreadPoolExecutor(max_workers=2) as executor:
-                text_future = executor.submit(run_text_analysis)
-                image_future = executor.submit(run_image_analysis)
-                
-                text_corrections = text_future.result()
-                image_corrections = image_future.result()
-            
-            # AIでテキスト分析と画像分析の結果を統合
-            corrections = corrector.integrate_analysis_results(text_corrections, image_corrections)
-            
-            # エクセル出力
-            excel_filename = f"校正結果_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            excel_path = os.path.join('outputs', excel_filename)
-            os.makedirs('outputs', exist_ok=True)
-            
-            # 統合結果をcorrectorのcorrectionsに設定
-            corrector.corrections = corrections
-            corrector.export_to_excel(excel_path)
-            
-            # 一時ファイル削除
-            os.remove(filepath)
+            if created:
+                # 校正処理はジョブとして登録し、すぐにジョブIDを返す
+                filepath = os.path.join(Config.UPLOAD_FOLDER, f"{key or job_id}.pdf")
+                os.replace(upload.path, filepath)
+                job_queue.start(job_id, run_correction_job, job_id, filepath, document_key)
             
             return jsonify({
                 'success': True,
-                'corrections': corrections,
-                'excel_file': excel_filename,
-                'max_pages': Config.MAX_PDF_PAGES,
-                'message': f'PDF校正が完了しました（テキスト分析+画像分析の統合結果、最大{Config.MAX_PDF_PAGES}ページまで処理）'
-            })
+                'job_id': job_id,
+                'status_url': url_for('job_status', job_id=job_id),
+                'result_url': url_for('job_result', job_id=job_id),
+                'events_url': url_for('job_events', job_id=job_id),
+                'reused': not created,
+                'message': 'PDF校正ジョブを受け付けました' if created else '同じPDFの校正ジョブの結果を使用します'
+            }), 202
         
         return jsonify({'error': 'PDFファイルをアップロードしてください'}), 400
     
+    except UploadRejected as e:
+        return jsonify({'error': str(e)}), e.status
+    except RequestEntityTooLarge:
+        max_mb = Config.MAX_CONTENT_LENGTH // (1024 * 1024)
+        return jsonify({'error': f'ファイルサイズが大きすぎます（最大{max_mb}MB）'}), 413
     except Exception as e:
         print(f"アップロードエラー: {str(e)}")
         return jsonify({'error': f'アップロード中にエラーが発生しました: {str(e)}'}), 500
 
+@app.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'ジョブが見つかりません'}), 404
+    
+    return jsonify({
+        'job_id': job['id'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at']
+    })
+
+@app.route('/jobs/<job_id>/events')
+@login_required
+def job_events(job_id):
+    """
+    進捗とページごとの結果をServer-Sent Eventsで配信
+    接続はSSE_MAX_STREAM_SECONDSで閉じ、ブラウザのEventSourceにLast-Event-IDで再接続させる
+    """
+    if job_queue.get(job_id) is None:
+        return jsonify({'error': 'ジョブが見つかりません'}), 404
+    
+    # 再接続時はLast-Event-ID以降のイベントから再開する
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    start = int(last_event_id) + 1 if last_event_id.isdigit() else 0
+    
+    def generate():
+        yield f"retry: {Config.SSE_RETRY_MS}\n\n"
+        for index, event, data in job_queue.iter_events(job_id, start=start, max_seconds=Config.SSE_MAX_STREAM_SECONDS):
+            if event is None:
+                # 接続維持用のコメント
+                yield ": keep-alive\n\n"
+                continue
+            yield f"id: {index}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # nginxのバッファリングを無効化
+    })
+
+@app.route('/jobs/<job_id>/result')
+@login_required
+def job_result(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'ジョブが見つかりません'}), 404
+    
+    if job['status'] == 'failed':
+        return jsonify({'error': f"校正処理中にエラーが発生しました: {job['error']}"}), 500
+    
+    if job['status'] != 'completed':
+        return jsonify({'status': job['status'], 'progress': job['progress']}), 202
+    
+    return jsonify(dict(success=True, **job['result']))
+
+@app.route('/jobs/<job_id>/excel')
+@login_required
+def job_excel(job_id):
+    """
+    完了したジョブの校正結果をエクセルとして直接返す
+    保存済みのファイルがあればそれを返し、なければ校正結果から作成する（大きな結果は一時ファイルに書き出してから送信）
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'ジョブが見つかりません'}), 404
+    
+    if job['status'] != 'completed':
+        return jsonify({'status': job['status'], 'progress': job['progress']}), 202
+    
+    # 保存済みのファイルはジョブIDから決まる名前でのみ参照する
+    excel_path = os.path.join(Config.OUTPUT_FOLDER, job_excel_filename(job['id']))
+    if job['result']['excel_file'] == job_excel_filename(job['id']) and os.path.exists(excel_path):
+        return send_file(excel_path, mimetype=EXCEL_MEDIA_TYPE, as_attachment=True,
+                         download_name=job['result']['excel_file'])
+    
+    buffer = tempfile.SpooledTemporaryFile(max_size=Config.EXCEL_SPOOL_MAX_BYTES)
+    write_corrections_excel(job['result']['corrections'], buffer)
+    buffer.seek(0)
+    return send_file(buffer, mimetype=EXCEL_MEDIA_TYPE, as_attachment=True,
+                     download_name=job['result']['excel_file'])
+
 @app.route('/download/<filename>')
 @login_required
 def download_file(filename):
-    return send_file(os.path.join('outputs', filename), as_attachment=True)
+    return send_file(os.path.join(Config.OUTPUT_FOLDER, filename), as_attachment=True)
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
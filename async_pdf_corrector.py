@@ -0,0 +1,131 @@
+"""
+asyncio版PDF校正モジュール
+ページごとにテキスト分析と画像分析をコルーチンとして実行し、
+両方の結果が揃ったページから順に統合する（全ページの分析完了を待たない）
+
+テキスト抽出・レンダリングはCPU用のエグゼキューターで、Bedrockの呼び出しは
+セマフォで同時実行数を制限したうえでI/O用のエグゼキューターで実行する
+（Bedrockへの実際の同時リクエスト数は、さらにプロセス全体のBEDROCK_MAX_CONCURRENCYで制限される）
+
+ページごとに呼び出すため、バッチ処理（BATCH_ENABLED）には対応していない
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from pdf_corrector_module import PDFCorrector
+from proofing_rules import needs_llm_check
+
+
+class AsyncPDFCorrector(PDFCorrector):
+    """ページ範囲の分析・統合をasyncioで実行するPDFCorrector（run_pipelineはそのまま使用できる）"""
+
+    def __init__(self):
+        super().__init__()
+        if Config.BATCH_ENABLED:
+            print("asyncio版パイプラインはバッチ処理に対応していないため、ページごとにBedrockを呼び出します")
+
+    def _run_window(self, document, pages, progress_callback, stage_callback, stage_delta_callback):
+        """ページ範囲の分析・統合をイベントループで実行"""
+        return asyncio.run(self.run_window_async(document, pages, progress_callback,
+                                                 stage_callback, stage_delta_callback))
+
+    async def run_window_async(self, document, pages, progress_callback, stage_callback, stage_delta_callback):
+        """ページごとにテキスト分析と画像分析を並行して行い、揃ったページから統合する"""
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(Config.ASYNC_MAX_IN_FLIGHT)
+        cpu_executor = ThreadPoolExecutor(max_workers=Config.ASYNC_CPU_WORKERS, thread_name_prefix='pdf-cpu')
+        io_executor = ThreadPoolExecutor(max_workers=Config.ASYNC_MAX_IN_FLIGHT, thread_name_prefix='bedrock')
+        callbacks = {stage: stage_callback(stage) for stage in ('text', 'image', 'integrated')}
+        delta_callbacks = {stage: stage_delta_callback(stage) for stage in ('text', 'image', 'integrated')}
+        integrated_count = 0
+
+        def emit(stage, entry):
+            if callbacks[stage]:
+                callbacks[stage](entry)
+            return entry
+
+        def page_delta(stage, page_num):
+            if not delta_callbacks[stage]:
+                return None
+            return lambda delta: delta_callbacks[stage](page_num, delta)
+
+        async def run_cpu(func, *args):
+            return await loop.run_in_executor(cpu_executor, func, *args)
+
+        async def call_model(func, *args):
+            async with semaphore:
+                return await loop.run_in_executor(io_executor, func, *args)
+
+        async def analyze_text(page_num):
+            """ページのテキスト校正と画像配置チェック"""
+            entries = []
+            for item in await run_cpu(self.extract_text_from_pdf, document, [page_num]):
+                if Config.RULE_CHECK_ENABLED:
+                    rule_entry = self.check_with_rules(item)
+                    if rule_entry:
+                        entries.append(emit('text', rule_entry))
+                    if Config.RULE_SKIP_LLM_ENABLED and not needs_llm_check(item['text']):
+                        continue
+                correction = await call_model(self.check_page_text, item['text'], page_delta('text', page_num))
+                entries.append(emit('text', self.text_entry(item, correction)))
+
+            images = await run_cpu(self.extract_images_from_pdf, document, [page_num])
+            corrections = await asyncio.gather(*[call_model(self.check_with_claude, str(img), "image") for img in images])
+            for img, correction in zip(images, corrections):
+                entries.append(emit('text', self.image_info_entry(img, correction)))
+            return entries
+
+        def render(page_num):
+            """画像分析用の画像を作成（図の切り出しモードでは(説明, base64画像, メディアタイプ)のリスト）"""
+            dpi = None
+            if Config.VISION_SKIP_TEXT_ONLY:
+                _, dpi = self.classify_page(document, page_num)
+                if dpi is None:
+                    return None
+            if Config.REGION_CROP_ENABLED:
+                regions = self.render_page_regions(document, page_num)
+                if regions:
+                    return [(label, self.encode_image(data), media_type)
+                            for label, data, media_type in regions]
+            image_data, media_type = self.render_page(document, page_num, dpi)
+            return self.encode_image(image_data), media_type
+
+        async def analyze_image(page_num):
+            """ページの画像分析（テキストのみのページは省略）"""
+            try:
+                rendered = await run_cpu(render, page_num)
+                if rendered is None:
+                    return []
+                on_delta = page_delta('image', page_num)
+                if isinstance(rendered, list):
+                    correction = await call_model(self.analyze_regions_with_claude, page_num, rendered, on_delta)
+                else:
+                    img_base64, media_type = rendered
+                    correction = await call_model(self.analyze_image_with_claude, img_base64, page_num,
+                                                  media_type, on_delta)
+                return [emit('image', self.image_analysis_entry(page_num, correction))]
+            except Exception as e:
+                print(f"画像分析エラー: {e}")
+                return [emit('image', self.image_analysis_entry(page_num, f"画像分析エラー: {str(e)}"))]
+
+        async def process_page(page_num):
+            """テキスト分析と画像分析の結果が揃い次第、そのページを統合"""
+            nonlocal integrated_count
+            text_results, image_results = await asyncio.gather(analyze_text(page_num), analyze_image(page_num))
+            if not text_results and not image_results:
+                return []
+            integrated = await call_model(self._integrate_page, page_num, text_results,
+                                          image_results, page_delta('integrated', page_num))
+            integrated_count += 1
+            if progress_callback:
+                progress_callback(f"ページ {page_num} の統合が完了しました ({integrated_count}/{len(pages)})")
+            return [emit('integrated', integrated)]
+
+        if progress_callback:
+            progress_callback(f"ページ {pages[0]}〜{pages[-1]} を分析中...")
+        try:
+            results = await asyncio.gather(*[process_page(page_num) for page_num in pages])
+        finally:
+            cpu_executor.shutdown(wait=True)
+            io_executor.shutdown(wait=True)
+        return [entry for entries in results for entry in entries]
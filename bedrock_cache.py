@@ -0,0 +1,133 @@
+"""
+Bedrock応答キャッシュモジュール
+リクエスト内容（プロンプト・画像・モデル・サンプリング設定）のハッシュをキーに
+Bedrockの応答をSQLiteに保存し、同じリクエストでは再呼び出しを省略する
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+class BedrockResultCache:
+    def __init__(self, db_path, ttl_seconds, max_bytes, prompt_version):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.prompt_version = prompt_version
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def _connect(self):
+        """初回アクセス時にデータベースを開く"""
+        if self.conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # gunicornの複数ワーカーから同時に使うためWALモードで開く
+            self.conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS bedrock_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_bedrock_cache_accessed ON bedrock_cache (accessed_at)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_bedrock_cache_created ON bedrock_cache (created_at)")
+            # 容量超過の判定で毎回全件を合計しないよう、合計サイズをトリガーで更新する（全ワーカーで共有）
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS bedrock_cache_stats (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    total_size INTEGER NOT NULL
+                )
+            """)
+            self.conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS bedrock_cache_insert AFTER INSERT ON bedrock_cache BEGIN
+                    UPDATE bedrock_cache_stats SET total_size = total_size + NEW.size WHERE id = 1;
+                END
+            """)
+            self.conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS bedrock_cache_delete AFTER DELETE ON bedrock_cache BEGIN
+                    UPDATE bedrock_cache_stats SET total_size = total_size - OLD.size WHERE id = 1;
+                END
+            """)
+            self.conn.execute("""
+                INSERT OR IGNORE INTO bedrock_cache_stats (id, total_size)
+                SELECT 1, COALESCE(SUM(size), 0) FROM bedrock_cache
+            """)
+            self.conn.commit()
+        return self.conn
+
+    def make_key(self, model_id, body):
+        """
+        キャッシュキーを生成
+        bodyにはプロンプト（ページのテキストや画像データ）とtemperature/top_p/top_kが含まれる
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{self.prompt_version}\n{model_id}\n".encode('utf-8'))
+        digest.update(body.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """キャッシュ済みの応答を取得（期限切れまたは未登録の場合はNone）"""
+        now = time.time()
+        try:
+            with self.lock:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT value, created_at FROM bedrock_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                value, created_at = row
+                if now - created_at > self.ttl_seconds:
+                    conn.execute("DELETE FROM bedrock_cache WHERE key = ?", (key,))
+                    conn.commit()
+                    return None
+                conn.execute("UPDATE bedrock_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                conn.commit()
+            return json.loads(value)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"キャッシュ読み込みエラー: {e}")
+            return None
+
+    def set(self, key, response_body):
+        """応答を保存し、期限切れと容量超過分を削除"""
+        value = json.dumps(response_body, ensure_ascii=False)
+        size = len(value.encode('utf-8'))
+        now = time.time()
+        try:
+            with self.lock:
+                conn = self._connect()
+                # INSERT OR REPLACEでは削除のトリガーが実行されないため、既存の行は先に削除する
+                conn.execute("DELETE FROM bedrock_cache WHERE key = ?", (key,))
+                conn.execute(
+                    "INSERT INTO bedrock_cache (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, now, now)
+                )
+                self._evict(conn, now)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"キャッシュ書き込みエラー: {e}")
+
+    def _evict(self, conn, now, batch_size=100):
+        conn.execute("DELETE FROM bedrock_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        excess = conn.execute("SELECT total_size FROM bedrock_cache_stats WHERE id = 1").fetchone()[0] - self.max_bytes
+        # 最近使われていないものから、batch_size件ずつ読み込んで超過分がなくなるまで削除
+        while excess > 0:
+            rows = conn.execute(
+                "SELECT key, size FROM bedrock_cache ORDER BY accessed_at LIMIT ?", (batch_size,)
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                conn.execute("DELETE FROM bedrock_cache WHERE key = ?", (key,))
+                excess -= size
+                if excess <= 0:
+                    break
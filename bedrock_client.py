@@ -0,0 +1,41 @@
+"""
+Bedrockクライアントモジュール
+プロセス全体で1つのbedrock-runtimeクライアントを共有し、
+コネクションプールの再利用と再試行の設定を一元化する
+"""
+import threading
+import boto3
+from botocore.config import Config as BotoConfig
+from config import Config
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_bedrock_client():
+    """共有のBedrockクライアントを取得（初回のみ作成、boto3のクライアントはスレッドセーフ）"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = boto3.client(
+                service_name='bedrock-runtime',
+                region_name=Config.AWS_DEFAULT_REGION,
+                aws_access_key_id=Config.AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=Config.AWS_SECRET_ACCESS_KEY,
+                verify=True,  # SSL証明書の検証を有効化
+                config=BotoConfig(
+                    # 同時リクエスト数分のコネクションを保持して再利用する
+                    max_pool_connections=Config.BEDROCK_MAX_POOL_CONNECTIONS,
+                    tcp_keepalive=True,
+                    connect_timeout=Config.BEDROCK_CONNECT_TIMEOUT,
+                    read_timeout=Config.BEDROCK_READ_TIMEOUT,
+                    # 再試行はAdaptiveConcurrencyLimiterで行うため、クライアント側の再試行は既定で無効にする
+                    # （両方で再試行すると1回の呼び出しが最大(MAX_ATTEMPTS+1)×(MAX_RETRIES+1)回送信され、
+                    #  リミッターがスロットリングを検出するのも遅れる）
+                    retries={
+                        'mode': Config.BEDROCK_RETRY_MODE,
+                        'max_attempts': Config.BEDROCK_MAX_ATTEMPTS
+                    }
+                )
+            )
+        return _client
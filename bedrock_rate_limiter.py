@@ -0,0 +1,186 @@
+"""
+Bedrockのレート制限モジュール
+1分あたりのリクエスト数（RPM）とトークン数（TPM）のトークンバケットで全ジョブのBedrock呼び出しを制御し、
+アカウントのクォータを超えてスロットリングされる前に送信を待たせる
+
+待機中のリクエストはジョブごとに公平に（Start-time Fair Queuing）送信し、
+ページ数の少ない文書のジョブには大きな重みを与えて優先する
+状態ファイルを指定すると、バケットの残量をファイルロックで複数プロセス（gunicornのワーカー）間で共有する
+（公平な順番待ちはプロセス内のみ）
+"""
+import os
+import json
+import time
+import threading
+from collections import deque
+from page_batching import IMAGE_TOKEN_ESTIMATE, estimate_tokens
+
+
+def estimate_request_tokens(body):
+    """リクエストの入力トークン数の概算と出力トークン数の上限の合計"""
+    request = json.loads(body)
+    tokens = request.get('max_tokens', 0)
+    for message in request.get('messages', []):
+        content = message['content']
+        if isinstance(content, str):
+            tokens += estimate_tokens(content)
+            continue
+        for part in content:
+            if part['type'] == 'image':
+                tokens += IMAGE_TOKEN_ESTIMATE
+            else:
+                tokens += estimate_tokens(part.get('text', ''))
+    return tokens
+
+
+class TokenBucket:
+    """
+    RPMとTPMのトークンバケット（0以下の上限は無制限）
+    バケットの容量はburst_seconds秒分で、一度に送信できる量を抑える
+    """
+    def __init__(self, requests_per_minute, tokens_per_minute, burst_seconds=10):
+        self.requests_per_second = requests_per_minute / 60
+        self.tokens_per_second = tokens_per_minute / 60
+        self.request_capacity = max(1.0, self.requests_per_second * burst_seconds)
+        self.token_capacity = self.tokens_per_second * burst_seconds
+        self.lock = threading.Lock()
+        self.state = None
+
+    def _refill(self, state, now):
+        if state is None:
+            return {'requests': self.request_capacity, 'tokens': self.token_capacity, 'updated': now}
+        elapsed = max(0.0, now - state['updated'])
+        state['requests'] = min(self.request_capacity, state['requests'] + elapsed * self.requests_per_second)
+        state['tokens'] = min(self.token_capacity, state['tokens'] + elapsed * self.tokens_per_second)
+        state['updated'] = now
+        return state
+
+    def _take(self, state, tokens):
+        """取得できれば0、できなければ必要な待機秒数を返す"""
+        waits = []
+        if self.requests_per_second > 0 and state['requests'] < 1:
+            waits.append((1 - state['requests']) / self.requests_per_second)
+        if self.tokens_per_second > 0:
+            # バケットの容量を超えるリクエストは満杯になった時点で送信する（残量は負になる）
+            needed = min(tokens, self.token_capacity)
+            if state['tokens'] < needed:
+                waits.append((needed - state['tokens']) / self.tokens_per_second)
+        if waits:
+            return max(waits)
+        state['requests'] -= 1
+        if self.tokens_per_second > 0:
+            state['tokens'] -= tokens
+        return 0
+
+    def _update(self, func):
+        with self.lock:
+            self.state = self._refill(self.state, time.time())
+            return func(self.state)
+
+    def try_take(self, tokens):
+        """リクエスト1件とトークンを取得（取得できなければ必要な待機秒数を返す）"""
+        return self._update(lambda state: self._take(state, tokens))
+
+    def adjust(self, tokens):
+        """実際の使用量との差分を反映（正の値は追加で消費、負の値は返却）"""
+        if self.tokens_per_second <= 0:
+            return
+
+        def apply(state):
+            state['tokens'] = min(self.token_capacity, state['tokens'] - tokens)
+        self._update(apply)
+
+
+class SharedTokenBucket(TokenBucket):
+    """バケットの残量をファイルに保存し、ファイルロックで複数プロセス間で共有するトークンバケット（Unix系のみ）"""
+    def __init__(self, state_path, requests_per_minute, tokens_per_minute, burst_seconds=10):
+        super().__init__(requests_per_minute, tokens_per_minute, burst_seconds)
+        self.state_path = state_path
+        directory = os.path.dirname(state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _update(self, func):
+        import fcntl
+        with self.lock:
+            with open(self.state_path, 'a+', encoding='utf-8') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    data = f.read()
+                    try:
+                        state = json.loads(data) if data else None
+                    except ValueError:
+                        state = None
+                    state = self._refill(state, time.time())
+                    result = func(state)
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                    return result
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class BedrockRateLimiter:
+    """
+    トークンバケットの前でリクエストをジョブごとに順番待ちさせるスケジューラー
+    各ジョブの仮想時間（消費したトークン数÷重み）が最も小さいジョブの先頭のリクエストから送信する
+    """
+    def __init__(self, bucket, small_document_pages=5, small_document_weight=4):
+        self.bucket = bucket
+        self.small_document_pages = small_document_pages
+        self.small_document_weight = small_document_weight
+        self.condition = threading.Condition()
+        self.jobs = {}
+        # 最後に送信したリクエストの仮想時間と、送信待ちのないジョブの仮想時間
+        self.virtual_time = 0.0
+        self.idle_virtual_times = {}
+
+    def _weight(self, pages):
+        if pages is not None and pages <= self.small_document_pages:
+            return self.small_document_weight
+        return 1
+
+    def _next_ticket(self):
+        # 仮想時間が同じ場合は重みの大きいジョブを優先
+        job = min(self.jobs.values(), key=lambda job: (job['virtual_time'], -job['weight']))
+        return job['waiting'][0]
+
+    def acquire(self, job_key, tokens, pages=None):
+        """送信の順番とレートの枠を待つ（pagesは文書のページ数、少ないほど優先）"""
+        ticket = object()
+        with self.condition:
+            job = self.jobs.get(job_key)
+            if job is None:
+                # 待機していた間の分を後からまとめて使えないよう、現在の仮想時間より前には戻さない
+                start = max(self.idle_virtual_times.pop(job_key, 0.0), self.virtual_time)
+                job = self.jobs[job_key] = {'virtual_time': start, 'waiting': deque(), 'weight': self._weight(pages)}
+            job['waiting'].append(ticket)
+            while True:
+                if self._next_ticket() is ticket:
+                    wait = self.bucket.try_take(tokens)
+                    if wait == 0:
+                        self._grant(job_key, job, tokens)
+                        return
+                    self.condition.wait(timeout=wait)
+                else:
+                    self.condition.wait()
+
+    def _grant(self, job_key, job, tokens):
+        job['waiting'].popleft()
+        self.virtual_time = job['virtual_time']
+        job['virtual_time'] += max(tokens, 1) / job['weight']
+        if not job['waiting']:
+            del self.jobs[job_key]
+            self.idle_virtual_times[job_key] = job['virtual_time']
+        # 現在の仮想時間に追い付いたジョブは記録しておく必要がない
+        for key in [key for key, value in self.idle_virtual_times.items() if value <= self.virtual_time]:
+            del self.idle_virtual_times[key]
+        self.condition.notify_all()
+
+    def complete(self, estimated_tokens, actual_tokens):
+        """呼び出し完了後に、見積もりと実際のトークン数の差をバケットに反映"""
+        if actual_tokens != estimated_tokens:
+            self.bucket.adjust(actual_tokens - estimated_tokens)
@@ -0,0 +1,217 @@
+"""
+オフラインベンチマーク
+合成PDFとBedrockの代替クライアントを使い、AWSに接続せずに各処理の所要時間とメモリ使用量を計測する
+
+使い方（リポジトリのルートで実行）:
+    python -m benchmarks.run_benchmarks --pages 20 --latency 1.0 --iterations 5
+    python -m benchmarks.run_benchmarks --output baseline.json
+    python -m benchmarks.run_benchmarks --baseline baseline.json --max-regression 0.2
+
+--baselineを指定すると、p95が基準値から--max-regressionの割合を超えて悪化した処理がある場合に終了コード1で終了する
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+import tracemalloc
+try:
+    import resource
+except ImportError:  # Windowsでは使えないため、プロセスのピークRSSは計測しない
+    resource = None
+
+# 設定の読み込み前に、ベンチマークに不要な機能を無効にする
+os.environ.setdefault('BEDROCK_CACHE_ENABLED', 'False')
+os.environ.setdefault('INCREMENTAL_PROOFING_ENABLED', 'False')
+os.environ.setdefault('MAX_PDF_PAGES', '0')
+os.environ.setdefault('UPLOAD_DEDUP_ENABLED', 'False')
+
+from benchmarks.stub_bedrock import StubBedrockClient
+from benchmarks.synthetic_pdf import make_synthetic_pdf
+
+TARGETS = ['process_pdf', 'run_image_analysis', 'integrate_analysis_results', 'upload']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='PDF校正処理のオフラインベンチマーク')
+    parser.add_argument('--pages', type=int, default=10, help='合成PDFのページ数')
+    parser.add_argument('--chars-per-page', type=int, default=800, help='1ページあたりの文字数')
+    parser.add_argument('--figures', type=int, default=1, help='1ページあたりの図の数')
+    parser.add_argument('--latency', type=float, default=0.5, help='Bedrock呼び出しの平均遅延（秒）')
+    parser.add_argument('--jitter', type=float, default=0.3, help='遅延のばらつき（対数正規分布の標準偏差）')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='スロットリングする呼び出しの割合')
+    parser.add_argument('--response-chars', type=int, default=400, help='応答の文字数')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help='出力の生成速度（0で無効）')
+    parser.add_argument('--retry-base-delay', type=float, default=0.1, help='スロットリング時の再試行の基本待機秒数')
+    parser.add_argument('--iterations', type=int, default=5, help='各処理の計測回数')
+    parser.add_argument('--targets', default=','.join(TARGETS), help='計測する処理（カンマ区切り）')
+    parser.add_argument('--output', help='結果を保存するJSONファイル')
+    parser.add_argument('--baseline', help='比較する基準の結果のJSONファイル')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='許容するp95の悪化の割合')
+    return parser.parse_args()
+
+
+def percentile(values, q):
+    """最近接順位法によるパーセンタイル"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def peak_rss_mb():
+    """プロセスの物理メモリ使用量（RSS）のピーク（MB、計測できない場合はNone）"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxはキロバイト、macOSはバイト単位
+    return round(peak / 1024 / (1024 if sys.platform == 'darwin' else 1), 2)
+
+
+def measure(func, iterations, pages):
+    """
+    funcを繰り返し実行して所要時間を計測し、最後にもう1回実行してメモリ使用量のピークを計測する
+    tracemallocはPythonのオブジェクトのみを計測し、MuPDFのPixmapや画像のエンコード用のバッファを含まないため、
+    プロセスのピークRSSも記録する（ピークRSSはプロセス開始からの最大値のため、この処理の計測中の増加量も記録する）
+    """
+    rss_before = peak_rss_mb()
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+
+    # tracemallocは実行を遅くするため、所要時間の計測とは別に実行する（Python側の確保量のみ）
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    rss_after = peak_rss_mb()
+
+    mean = sum(durations) / len(durations)
+    return {
+        'iterations': iterations,
+        'mean': round(mean, 4),
+        'p50': round(percentile(durations, 0.50), 4),
+        'p95': round(percentile(durations, 0.95), 4),
+        'p99': round(percentile(durations, 0.99), 4),
+        'pages_per_second': round(pages / mean, 2) if mean else None,
+        'peak_memory_mb': round(peak / 1024 / 1024, 2),
+        'peak_rss_mb': rss_after,
+        'peak_rss_growth_mb': round(rss_after - rss_before, 2) if rss_after is not None else None
+    }
+
+
+def main():
+    args = parse_args()
+    targets = [target.strip() for target in args.targets.split(',') if target.strip()]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        print(f"不明な処理: {', '.join(sorted(unknown))}")
+        return 2
+
+    # 出力先を一時ディレクトリにしてから、Webアプリを読み込む
+    from config import Config
+    work_dir = tempfile.mkdtemp(prefix='pdf-bench-')
+    for name in ('UPLOAD_FOLDER', 'OUTPUT_FOLDER', 'JOB_FOLDER', 'REVISION_FOLDER', 'CHECKPOINT_FOLDER'):
+        setattr(Config, name, os.path.join(work_dir, name.lower()))
+    Config.BEDROCK_RETRY_BASE_DELAY = args.retry_base_delay
+
+    stub = StubBedrockClient(
+        latency=args.latency,
+        latency_jitter=args.jitter,
+        throttle_rate=args.throttle_rate,
+        response_chars=args.response_chars,
+        tokens_per_second=args.tokens_per_second
+    )
+    import bedrock_client
+    bedrock_client._client = stub
+
+    from pdf_corrector_module import PDFCorrector
+
+    pdf_path = make_synthetic_pdf(os.path.join(work_dir, 'synthetic.pdf'), args.pages,
+                                  args.chars_per_page, args.figures)
+    print(f"合成PDF: {args.pages}ページ, 1ページ{args.chars_per_page}文字, 図{args.figures}個/ページ")
+    print(f"Bedrock代替: 遅延{args.latency}秒, スロットリング率{args.throttle_rate}, 応答{args.response_chars}文字")
+
+    def run_process_pdf():
+        PDFCorrector().process_pdf(pdf_path)
+
+    def run_image_analysis():
+        PDFCorrector().run_image_analysis(pdf_path)
+
+    integration_inputs = {}
+
+    def run_integration():
+        if not integration_inputs:
+            corrector = PDFCorrector()
+            integration_inputs['text'] = corrector.process_pdf(pdf_path)
+            integration_inputs['image'] = corrector.run_image_analysis(pdf_path)
+        PDFCorrector().integrate_analysis_results(integration_inputs['text'], integration_inputs['image'])
+
+    flask_client = None
+
+    def run_upload():
+        nonlocal flask_client
+        import app as web_app
+        if flask_client is None:
+            flask_client = web_app.app.test_client()
+            with flask_client.session_transaction() as session:
+                session['logged_in'] = True
+        with open(pdf_path, 'rb') as f:
+            response = flask_client.post('/upload', data={'file': (f, 'synthetic.pdf')},
+                                         content_type='multipart/form-data')
+        job_id = response.get_json()['job_id']
+        while True:
+            job = web_app.job_queue.get(job_id)
+            if job['status'] == 'completed':
+                return
+            if job['status'] == 'failed':
+                raise RuntimeError(job['error'])
+            time.sleep(0.02)
+
+    functions = {
+        'process_pdf': run_process_pdf,
+        'run_image_analysis': run_image_analysis,
+        'integrate_analysis_results': run_integration,
+        'upload': run_upload
+    }
+
+    if 'integrate_analysis_results' in targets:
+        run_integration()  # 統合の入力は計測前に用意する
+
+    results = {}
+    for target in targets:
+        calls_before = stub.calls
+        results[target] = measure(functions[target], args.iterations, args.pages)
+        results[target]['bedrock_calls'] = (stub.calls - calls_before) // (args.iterations + 1)
+        r = results[target]
+        print(f"{target:28s} p50={r['p50']:.3f}s p95={r['p95']:.3f}s p99={r['p99']:.3f}s "
+              f"{r['pages_per_second']}ページ/秒 メモリ{r['peak_memory_mb']}MB "
+              f"ピークRSS{r['peak_rss_mb']}MB（+{r['peak_rss_growth_mb']}MB） 呼び出し{r['bedrock_calls']}回/実行")
+    print(f"スロットリング: {stub.throttled}/{stub.calls}回")
+
+    report = {'parameters': vars(args), 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    # 基準の結果と比較
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = []
+        for target, result in results.items():
+            if target in baseline and result['p95'] > baseline[target]['p95'] * (1 + args.max_regression):
+                regressions.append(f"{target}: p95 {baseline[target]['p95']:.3f}s → {result['p95']:.3f}s")
+        if regressions:
+            print("性能が基準より悪化しました:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("基準との比較: 問題なし")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+ベンチマーク用のBedrockクライアントの代替
+invoke_model / invoke_model_with_response_stream と同じ形式の応答を、
+指定した遅延・スロットリング率・応答の長さで返す（AWSへの通信は行わない）
+"""
+import io
+import re
+import json
+import time
+import random
+import threading
+from botocore.exceptions import ClientError
+
+PAGE_MARKER_PATTERN = re.compile(r'=== ページ (\d+) ===')
+
+
+class StubBedrockClient:
+    def __init__(self, latency=1.0, latency_jitter=0.3, throttle_rate=0.0, response_chars=400,
+                 tokens_per_second=0.0, seed=0):
+        """
+        latency: 1回の呼び出しの平均遅延（秒）
+        latency_jitter: 遅延のばらつき（対数正規分布の標準偏差）
+        throttle_rate: ThrottlingExceptionを返す割合（0〜1）
+        response_chars: 応答の文字数
+        tokens_per_second: 出力の生成速度（0の場合は応答の長さによる遅延を加えない）
+        """
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.throttle_rate = throttle_rate
+        self.response_chars = response_chars
+        self.tokens_per_second = tokens_per_second
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.throttled = 0
+        self.request_bytes = 0
+
+    def _begin(self, body):
+        """呼び出しを記録し、スロットリングするかどうかと遅延を決める"""
+        with self.lock:
+            self.calls += 1
+            self.request_bytes += len(body)
+            throttle = self.random.random() < self.throttle_rate
+            delay = self.latency * self.random.lognormvariate(0, self.latency_jitter) if self.latency else 0
+            if throttle:
+                self.throttled += 1
+        if throttle:
+            time.sleep(min(delay, 0.05))
+            raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'InvokeModel')
+        return delay
+
+    def _response_text(self, body):
+        """リクエストの内容に応じた応答（複数ページのリクエストにはページ番号をキーにしたJSON）を作成"""
+        request = json.loads(body)
+        content = request['messages'][0]['content']
+        prompt = content if isinstance(content, str) else "\n".join(
+            part.get('text', '') for part in content if part['type'] == 'text')
+        filler = "- 誤字脱字: 「ああります」→「あります」\n- 文法・表現: 特になし\n- その他: 表記ゆれを確認してください\n"
+        text = (filler * (self.response_chars // len(filler) + 1))[:self.response_chars]
+        pages = PAGE_MARKER_PATTERN.findall(prompt)
+        if len(pages) > 1 and '"pages"' in prompt:
+            return json.dumps({'pages': {page: text for page in pages}}, ensure_ascii=False)
+        return text
+
+    def _usage(self, body, text):
+        return {'input_tokens': len(body) // 4, 'output_tokens': len(text)}
+
+    def invoke_model(self, modelId, body, contentType=None, accept=None):
+        delay = self._begin(body)
+        text = self._response_text(body)
+        if self.tokens_per_second:
+            delay += len(text) / self.tokens_per_second
+        time.sleep(delay)
+        response_body = {
+            'type': 'message',
+            'role': 'assistant',
+            'content': [{'type': 'text', 'text': text}],
+            'stop_reason': 'end_turn',
+            'usage': self._usage(body, text)
+        }
+        return {'body': io.BytesIO(json.dumps(response_body, ensure_ascii=False).encode('utf-8'))}
+
+    def invoke_model_with_response_stream(self, modelId, body, contentType=None, accept=None):
+        delay = self._begin(body)
+        text = self._response_text(body)
+        usage = self._usage(body, text)
+
+        def events():
+            def event(data):
+                return {'chunk': {'bytes': json.dumps(data, ensure_ascii=False).encode('utf-8')}}
+
+            time.sleep(delay)
+            yield event({'type': 'message_start', 'message': {'usage': {'input_tokens': usage['input_tokens']}}})
+            step = 20
+            for start in range(0, len(text), step):
+                if self.tokens_per_second:
+                    time.sleep(step / self.tokens_per_second)
+                yield event({'type': 'content_block_delta', 'index': 0,
+                             'delta': {'type': 'text_delta', 'text': text[start:start + step]}})
+            yield event({'type': 'message_delta', 'delta': {'stop_reason': 'end_turn'},
+                         'usage': {'output_tokens': usage['output_tokens']}})
+            yield event({'type': 'message_stop'})
+
+        return {'body': events()}
@@ -0,0 +1,71 @@
+"""
+ベンチマーク用の合成PDF生成
+ページ数・1ページあたりの文字数・図の数を指定して、日本語の文章と図を含むPDFを作成する
+"""
+import random
+import fitz  # PyMuPDF
+
+# 本文に使う文（一部に誤字・表記ゆれを含む）
+SENTENCES = [
+    "本システムはPDFファイルの校正を自動で行います。",
+    "お問い合わせは下記の窓口までご連絡ください。",
+    "申し込みの受付は毎月末日に締め切ります。",
+    "会議の打ち合わせ資料を事前に配布しました。",
+    "製品の取り扱いには十分注意して下さい。",
+    "売上高は前年比で１２％増加しました。",
+    "この機能を使用することで作業時間を削減出来ます。",
+    "詳細については添付資料をご確認くださいい。",
+    "新しいサービスを行なう予定です。",
+    "データの集計結果を表にまとめました。",
+    "お客さまからのご意見を反映して改善を行いました。",
+    "工事期間中はご不便をおかけしますが、ご理解およびご協力をお願いします。",
+]
+
+
+def _figure_pixmap(rng, size=64):
+    """単色の矩形とグラデーションを持つ画像を作成"""
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, size, size), False)
+    pix.set_rect(pix.irect, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    for y in range(0, size, 4):
+        pix.set_rect(fitz.IRect(0, y, size, y + 2), (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    return pix
+
+
+def make_synthetic_pdf(path, pages=10, chars_per_page=800, figures_per_page=1, seed=0):
+    """
+    合成PDFを作成
+    図は上から順に配置し、偶数番目の図は埋め込み画像、奇数番目の図はベクター図形（枠と塗り）にする
+    """
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_index in range(pages):
+        page = doc.new_page()  # A4
+        width, height = page.rect.width, page.rect.height
+        margin = 56
+
+        # 図は下半分に配置し、本文は上半分から流し込む
+        figure_top = height / 2 if figures_per_page else height - margin
+        figure_height = (height / 2 - margin) / max(figures_per_page, 1)
+        for figure_index in range(figures_per_page):
+            top = figure_top + figure_index * figure_height + 4
+            rect = fitz.Rect(margin, top, width - margin, top + figure_height - 8)
+            if figure_index % 2 == 0:
+                page.insert_image(rect, pixmap=_figure_pixmap(rng))
+            else:
+                page.draw_rect(rect, color=(0, 0, 0), fill=(0.8, 0.9, 1.0))
+                for line in range(5):
+                    y = rect.y0 + (line + 1) * rect.height / 6
+                    page.draw_line(fitz.Point(rect.x0, y), fitz.Point(rect.x1, y), color=(0.3, 0.3, 0.3))
+
+        text = ""
+        while len(text) < chars_per_page:
+            text += rng.choice(SENTENCES)
+            if rng.random() < 0.2:
+                text += "\n"
+        text = f"第{page_index + 1}章\n" + text[:chars_per_page]
+        text_rect = fitz.Rect(margin, margin, width - margin, figure_top - 8)
+        page.insert_textbox(text_rect, text, fontname="japan", fontsize=9)
+
+    doc.save(path)
+    doc.close()
+    return path
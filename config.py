@@ -44,6 +44,63 @@ class Config:
     TEMPERATURE = 0.0  # 温度差設定 (0.0-1.0, 低いほど一貫性が高く、高いほど創造性が高い) デフォルト0.3
     TOP_P = 0.9       # Top-p設定 (0.0-1.0, 核サンプリング)
     TOP_K = 50        # Top-k設定 (1-100, 上位k個のトークンから選択)
+    PROMPT_TEMPLATE_VERSION = '1'  # プロンプトを変更した場合は更新する（キャッシュキーに含まれる）
+    
+    # Bedrock応答キャッシュ設定
+    BEDROCK_CACHE_ENABLED = os.getenv('BEDROCK_CACHE_ENABLED', 'True').lower() == 'true'
+    BEDROCK_CACHE_PATH = os.getenv('BEDROCK_CACHE_PATH', 'cache/bedrock_cache.sqlite3')
+    BEDROCK_CACHE_TTL_SECONDS = int(os.getenv('BEDROCK_CACHE_TTL_SECONDS', str(30 * 24 * 60 * 60)))  # 30日
+    BEDROCK_CACHE_MAX_BYTES = int(os.getenv('BEDROCK_CACHE_MAX_BYTES', str(500 * 1024 * 1024)))  # 500MB
+    
+    # テキスト校正設定
+    TEXT_MAX_TOKENS = int(os.getenv('TEXT_MAX_TOKENS', '2000'))  # テキスト校正の応答の最大トークン数
+    CHUNK_TOKEN_BUDGET = int(os.getenv('CHUNK_TOKEN_BUDGET', '1500'))  # これを超えるページは分割して校正する
+    CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', '100'))  # 前後のチャンクで重複させるトークン数
+    
+    # ルールベース校正設定（AIを呼び出す前の表記チェック）
+    RULE_CHECK_ENABLED = os.getenv('RULE_CHECK_ENABLED', 'True').lower() == 'true'
+    RULE_SKIP_LLM_ENABLED = os.getenv('RULE_SKIP_LLM_ENABLED', 'True').lower() == 'true'  # 短いページや数値中心のページはAI校正を省略する
+    
+    # 並列処理設定
+    PAGE_CONCURRENCY = int(os.getenv('PAGE_CONCURRENCY', '4'))  # 1文書内で同時に分析するページ数
+    BEDROCK_MAX_CONCURRENCY = int(os.getenv('BEDROCK_MAX_CONCURRENCY', '8'))  # プロセス全体のBedrock同時リクエスト数の上限
+    BEDROCK_MAX_RETRIES = int(os.getenv('BEDROCK_MAX_RETRIES', '4'))  # スロットリング・一時的なエラー時の再試行回数
+    BEDROCK_RETRY_BASE_DELAY = float(os.getenv('BEDROCK_RETRY_BASE_DELAY', '1.0'))  # 再試行の基本待機秒数
+    
+    # レート制限設定（アカウントのクォータに合わせて設定、0は無制限）
+    BEDROCK_REQUESTS_PER_MINUTE = int(os.getenv('BEDROCK_REQUESTS_PER_MINUTE', '0'))
+    BEDROCK_TOKENS_PER_MINUTE = int(os.getenv('BEDROCK_TOKENS_PER_MINUTE', '0'))  # 入力と出力の合計
+    RATE_LIMIT_BURST_SECONDS = float(os.getenv('RATE_LIMIT_BURST_SECONDS', '10'))  # 一度に送信できる量（何秒分の枠か）
+    RATE_LIMIT_STATE_FILE = os.getenv('RATE_LIMIT_STATE_FILE', '')  # 指定すると複数プロセスで枠を共有する（例: cache/rate_limit.json）
+    RATE_LIMIT_SMALL_DOCUMENT_PAGES = int(os.getenv('RATE_LIMIT_SMALL_DOCUMENT_PAGES', '5'))  # このページ数以下の文書を優先する
+    RATE_LIMIT_SMALL_DOCUMENT_WEIGHT = int(os.getenv('RATE_LIMIT_SMALL_DOCUMENT_WEIGHT', '4'))  # 優先する文書の重み（通常は1）
+    
+    # asyncio版パイプライン設定（ページごとにテキスト・画像の結果が揃った時点で統合する）
+    ASYNC_PIPELINE_ENABLED = os.getenv('ASYNC_PIPELINE_ENABLED', 'False').lower() == 'true'
+    ASYNC_MAX_IN_FLIGHT = int(os.getenv('ASYNC_MAX_IN_FLIGHT', str(BEDROCK_MAX_CONCURRENCY)))  # 1文書内の同時Bedrock呼び出し数（BEDROCK_MAX_CONCURRENCYを超えても同時には送信されない）
+    ASYNC_CPU_WORKERS = int(os.getenv('ASYNC_CPU_WORKERS', '2'))  # テキスト抽出・レンダリング用のワーカー数
+    
+    # プロセスプール設定（テキスト抽出・レンダリングを別プロセスで実行し、複数コアを使う）
+    PROCESS_POOL_ENABLED = os.getenv('PROCESS_POOL_ENABLED', 'False').lower() == 'true'
+    PROCESS_POOL_WORKERS = int(os.getenv('PROCESS_POOL_WORKERS', str(os.cpu_count() or 1)))
+    
+    # バッチ設定（複数ページを1回のBedrockリクエストにまとめる）
+    BATCH_ENABLED = os.getenv('BATCH_ENABLED', 'False').lower() == 'true'
+    BATCH_MAX_PAGES = int(os.getenv('BATCH_MAX_PAGES', '8'))  # テキスト校正で1リクエストにまとめる最大ページ数
+    BATCH_MAX_IMAGES = int(os.getenv('BATCH_MAX_IMAGES', '3'))  # 画像分析で1リクエストにまとめる最大ページ数
+    BATCH_TOKEN_BUDGET = int(os.getenv('BATCH_TOKEN_BUDGET', '12000'))  # 1リクエストの入力トークン数の目安の上限
+    BATCH_MAX_OUTPUT_TOKENS = 8192  # バッチ応答のmax_tokens上限（Claude 3.5 Sonnet v2の出力上限）
+    
+    # Bedrockクライアント設定（プロセス全体で共有）
+    BEDROCK_MAX_POOL_CONNECTIONS = int(os.getenv('BEDROCK_MAX_POOL_CONNECTIONS', str(max(BEDROCK_MAX_CONCURRENCY, PAGE_CONCURRENCY * 2))))
+    BEDROCK_RETRY_MODE = os.getenv('BEDROCK_RETRY_MODE', 'standard')  # adaptive / standard / legacy
+    BEDROCK_MAX_ATTEMPTS = int(os.getenv('BEDROCK_MAX_ATTEMPTS', '0'))  # botocore内での再試行回数（初回を除く、再試行はBEDROCK_MAX_RETRIESで行う）
+    BEDROCK_CONNECT_TIMEOUT = int(os.getenv('BEDROCK_CONNECT_TIMEOUT', '10'))
+    BEDROCK_READ_TIMEOUT = int(os.getenv('BEDROCK_READ_TIMEOUT', '300'))  # 長い応答の生成を待つため長めに設定
+    
+    # ストリーミング設定（生成途中の校正結果を画面に表示する）
+    BEDROCK_STREAMING_ENABLED = os.getenv('BEDROCK_STREAMING_ENABLED', 'True').lower() == 'true'
+    BEDROCK_STREAM_FLUSH_SECONDS = float(os.getenv('BEDROCK_STREAM_FLUSH_SECONDS', '0.2'))  # 生成途中のテキストをまとめて通知する間隔
     
     # Flask設定
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-here')
@@ -51,11 +108,55 @@ class Config:
     
     # ファイルアップロード設定
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50MB
+    UPLOAD_MAX_PAGES = int(os.getenv('UPLOAD_MAX_PAGES', '1000'))  # これより多いページ数のPDFは受け付けない（0以下で無制限）
     UPLOAD_FOLDER = 'uploads'
     OUTPUT_FOLDER = 'outputs'
+    EXCEL_SPOOL_MAX_BYTES = 8 * 1024 * 1024  # エクセルのダウンロードでメモリ上に保持する上限（超えると一時ファイルに書き出す）
+    
+    # 計測設定（/metricsでPrometheus形式の計測値を公開する）
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # Prometheusなどログインせずに/metricsを参照する場合のトークン
     
     # PDF校正設定
-    MAX_PDF_PAGES = 3  # 校正対象の最大ページ数
+    MAX_PDF_PAGES = int(os.getenv('MAX_PDF_PAGES', '3'))  # 校正対象の最大ページ数（0以下で無制限）
+    PAGE_WINDOW_SIZE = int(os.getenv('PAGE_WINDOW_SIZE', '10'))  # 長い文書を一度に抽出・分析・統合するページ数
+    CHECKPOINT_FOLDER = 'checkpoints'  # 長い文書の処理を途中から再開するためのチェックポイント
+    
+    # 画像分析用のページ画像設定
+    RASTER_DPI = int(os.getenv('RASTER_DPI', '200'))  # レンダリング解像度
+    RASTER_MAX_LONG_EDGE = int(os.getenv('RASTER_MAX_LONG_EDGE', '1568'))  # 長辺の上限ピクセル数（Claudeの画像入力で縮小されない上限）
+    RASTER_FORMAT = os.getenv('RASTER_FORMAT', 'jpeg').lower()  # jpeg / png / webp
+    RASTER_QUALITY = int(os.getenv('RASTER_QUALITY', '85'))  # JPEG/WebPの品質 (1-100)
+    
+    # 画像分析の対象ページ判定（テキストのみのページは画像分析を省略する）
+    VISION_SKIP_TEXT_ONLY = os.getenv('VISION_SKIP_TEXT_ONLY', 'True').lower() == 'true'
+    VISION_MIN_DRAWINGS = int(os.getenv('VISION_MIN_DRAWINGS', '5'))  # これ以上の図形を含むページは画像分析する
+    VISION_INK_RATIO = float(os.getenv('VISION_INK_RATIO', '0.25'))  # テキスト以外の範囲の白以外の画素の割合がこれ以上のページは画像分析する
+    VISION_COLOR_RATIO = float(os.getenv('VISION_COLOR_RATIO', '0.01'))  # 有彩色の画素の割合がこれ以上のページは画像分析する
+    VISION_GRAPHICS_DPI = int(os.getenv('VISION_GRAPHICS_DPI', '150'))  # 図形のみのページの解像度
+    
+    # 図を含むページは図の範囲のみを高解像度で切り出し、ページ全体は低解像度で送信する
+    REGION_CROP_ENABLED = os.getenv('REGION_CROP_ENABLED', 'False').lower() == 'true'
+    REGION_DPI = int(os.getenv('REGION_DPI', '300'))  # 図の切り出しの解像度
+    REGION_OVERVIEW_DPI = int(os.getenv('REGION_OVERVIEW_DPI', '72'))  # ページ全体の解像度
+    REGION_MARGIN = float(os.getenv('REGION_MARGIN', '12'))  # 図の周囲に含める余白（ポイント）
+    REGION_MIN_SIZE = float(os.getenv('REGION_MIN_SIZE', '24'))  # これより小さい画像（アイコン等）は切り出さない（ポイント）
+    REGION_MAX_CROPS = int(os.getenv('REGION_MAX_CROPS', '4'))  # 1ページあたりの切り出し数の上限
+    
+    # 差分校正設定（同じ文書の改訂版では変更のあったページのみ再分析する）
+    INCREMENTAL_PROOFING_ENABLED = os.getenv('INCREMENTAL_PROOFING_ENABLED', 'True').lower() == 'true'
+    REVISION_FOLDER = 'revisions'
+    
+    # ジョブキュー設定
+    JOB_FOLDER = 'jobs'
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))  # 同時に処理するジョブ数
+    JOB_RETENTION_SECONDS = int(os.getenv('JOB_RETENTION_SECONDS', str(24 * 60 * 60)))  # ジョブ結果の保持期間
+    JOB_STALE_SECONDS = int(os.getenv('JOB_STALE_SECONDS', str(60 * 60)))  # この時間更新のない待機中・実行中のジョブには合流しない
+    # SSEの接続はgunicornのスレッドを1つ占有するため、一定時間で閉じてブラウザにLast-Event-IDで再接続させる
+    # （閉じている間に他のリクエストがスレッドを使えるようにし、閲覧者がスレッド数を超えても/uploadが止まらないようにする）
+    SSE_MAX_STREAM_SECONDS = int(os.getenv('SSE_MAX_STREAM_SECONDS', '30'))  # 1回の接続でイベントを配信する最大秒数（0以下は無制限）
+    SSE_RETRY_MS = int(os.getenv('SSE_RETRY_MS', '1000'))  # 接続を閉じてからブラウザが再接続するまでの待機ミリ秒
+    UPLOAD_DEDUP_ENABLED = os.getenv('UPLOAD_DEDUP_ENABLED', 'True').lower() == 'true'  # 同じ内容のPDFは実行中・完了済みのジョブに合流する
     
     # 認証設定
     LOGIN_ID = os.getenv('LOGIN_ID', 'your-login-id')
@@ -0,0 +1,71 @@
+"""
+校正結果のエクセル出力モジュール
+openpyxlの書き込み専用モードで1行ずつ出力し、校正結果の件数が増えてもメモリ使用量を一定に保つ
+書き込み専用モードでは行の出力後に列幅を変更できないため、列幅は出力前にデータの文字数から決める
+"""
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+EXCEL_HEADERS = ['ページ', 'タイプ', '内容', '校正結果']
+EXCEL_MAX_COLUMN_WIDTH = 50
+EXCEL_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# 校正結果のタイプの表示名
+CORRECTION_TYPE_NAMES = {
+    'text': 'テキスト',
+    'image': '画像',
+    'integrated': '校正',
+    'rule': 'ルール',
+    'info': '情報'
+}
+
+
+def correction_row(correction):
+    """校正結果1件分の行の値を取得"""
+    return [
+        correction['page'],
+        CORRECTION_TYPE_NAMES.get(correction['type'], correction['type']),
+        correction['content'],
+        correction['correction']
+    ]
+
+
+def column_widths(corrections):
+    """ヘッダーと各行の文字数から列幅を決める（上限に達した列はそれ以上数えない）"""
+    max_lengths = [len(header) for header in EXCEL_HEADERS]
+    limit = EXCEL_MAX_COLUMN_WIDTH - 2
+    for correction in corrections:
+        for index, value in enumerate(correction_row(correction)):
+            if max_lengths[index] < limit:
+                max_lengths[index] = max(max_lengths[index], len(str(value)))
+    return [min(length + 2, EXCEL_MAX_COLUMN_WIDTH) for length in max_lengths]
+
+
+def write_corrections_excel(corrections, output, title="校正結果"):
+    """
+    校正結果をエクセルに出力
+    outputにはファイルパスまたは書き込み可能なファイルオブジェクト（HTTPレスポンス用の一時ファイルなど）を指定する
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+
+    # 列幅は行を書き込む前に設定する
+    for index, width in enumerate(column_widths(corrections), 1):
+        ws.column_dimensions[get_column_letter(index)].width = width
+
+    # ヘッダー設定
+    header_cells = []
+    for header in EXCEL_HEADERS:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = Font(bold=True)
+        cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    # データ入力
+    for correction in corrections:
+        ws.append(correction_row(correction))
+
+    wb.save(output)
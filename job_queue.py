@@ -0,0 +1,268 @@
+"""
+校正ジョブキューモジュール
+/upload から投入されたPDF校正処理をワーカープールで非同期に実行する
+
+ジョブの状態はJOB_FOLDERにJSONとして保存するため、
+gunicornの別ワーカーからでも状態と結果を参照できる
+進捗やページごとの結果はイベントとしてJSON Lines形式で追記し、SSEで配信する
+同じ内容のアップロードはキーファイルで実行中・完了済みのジョブに合流させる
+"""
+import os
+import json
+import uuid
+import time
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobQueue:
+    def __init__(self, max_workers, job_folder, retention_seconds=24 * 60 * 60, stale_seconds=60 * 60):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pdf-job')
+        self.job_folder = job_folder
+        self.retention_seconds = retention_seconds
+        self.stale_seconds = stale_seconds
+        self.jobs = {}
+        self.lock = threading.Lock()
+        os.makedirs(self.job_folder, exist_ok=True)
+
+    def reserve(self, key):
+        """
+        同じキーの実行中・完了済みのジョブがあれば(ジョブID, False)を返し、
+        なければジョブを登録して(ジョブID, True)を返す（登録したジョブはstartで実行する）
+        キーはファイルの作成で予約するため、gunicornの別ワーカーからの同時の登録も1つにまとまる
+        キーがNoneの場合は常に新しいジョブを登録する
+        """
+        path = self._key_path(key)
+        if path is None:
+            return self._create(), True
+        for _ in range(100):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        job_id = f.read().strip()
+                except FileNotFoundError:
+                    continue
+                if not job_id:
+                    # 別のリクエストがジョブIDを書き込み中
+                    time.sleep(0.01)
+                    continue
+                job = self.get(job_id)
+                if job and job['status'] != 'failed':
+                    return job_id, False
+                # 失敗したジョブ・保持期間を過ぎたジョブ・実行するワーカーが停止したジョブには合流しない
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            job_id = self._create()
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(job_id)
+            return job_id, True
+        # キーファイルが書き込まれないまま残っている場合は合流しない
+        return self._create(), True
+
+    def start(self, job_id, func, *args, **kwargs):
+        """登録済みのジョブをワーカーで実行（funcにはprogress_callbackとevent_callbackが渡される）"""
+        self.executor.submit(self._run, job_id, func, args, kwargs)
+
+    def _create(self):
+        job_id = uuid.uuid4().hex
+        now = datetime.now().isoformat()
+        job = {
+            'id': job_id,
+            'status': 'queued',
+            'progress': '待機中...',
+            'result': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now,
+            'pid': os.getpid()
+        }
+        with self.lock:
+            self.jobs[job_id] = job
+            self._save(job)
+        self._cleanup()
+        return job_id
+
+    def get(self, job_id):
+        """
+        ジョブの状態を取得（他プロセスのジョブはファイルから読み込む）
+        実行するワーカーが停止した待機中・実行中のジョブは失敗として記録してから返す
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job:
+                return dict(job)
+        job = self._load(job_id)
+        if job and job['status'] in ('queued', 'running') and self._is_abandoned(job):
+            job = self._abandon(job_id)
+        return job
+
+    def _run(self, job_id, func, args, kwargs):
+        """ワーカースレッドでジョブを実行"""
+        self._update(job_id, status='running', progress='処理を開始しました...')
+
+        def progress_callback(message):
+            self._update(job_id, progress=message)
+            self.add_event(job_id, 'progress', {'message': message})
+
+        def event_callback(event, data):
+            self.add_event(job_id, event, data)
+
+        try:
+            result = func(*args, progress_callback=progress_callback, event_callback=event_callback, **kwargs)
+            self._update(job_id, status='completed', progress='校正完了！', result=result)
+            self.add_event(job_id, 'completed', {'job_id': job_id})
+        except Exception as e:
+            print(f"ジョブ実行エラー ({job_id}): {e}")
+            self._update(job_id, status='failed', progress='エラーが発生しました', error=str(e))
+            self.add_event(job_id, 'failed', {'error': str(e)})
+        finally:
+            # 完了したジョブはファイルから参照する
+            with self.lock:
+                self.jobs.pop(job_id, None)
+
+    def _is_abandoned(self, job):
+        """
+        待機中・実行中のまま更新されなくなったジョブか
+        （実行していたプロセスが存在しない、このプロセスのジョブなのに実行中の一覧にない、一定時間更新がない）
+        """
+        pid = job.get('pid')
+        if pid == os.getpid():
+            with self.lock:
+                if job['id'] not in self.jobs:
+                    return True
+        elif pid is not None:
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                return True
+            except OSError:
+                pass  # 権限がない場合はプロセスが存在する
+        updated_at = datetime.fromisoformat(job['updated_at']).timestamp()
+        return datetime.now().timestamp() - updated_at > self.stale_seconds
+
+    def _abandon(self, job_id):
+        """
+        停止したワーカーのジョブを失敗として記録し、イベントの配信を終了させる
+        確認の間に完了していた場合は記録せず、最新の状態を返す
+        """
+        with self.lock:
+            job = self._load(job_id)
+            if job is None or job['status'] not in ('queued', 'running'):
+                return job
+            print(f"停止したワーカーのジョブを破棄します ({job_id})")
+            job.update(status='failed', progress='エラーが発生しました',
+                       error='処理していたワーカーが停止しました', updated_at=datetime.now().isoformat())
+            self._save(job)
+        self.add_event(job_id, 'failed', {'error': job['error']})
+        return job
+
+    def add_event(self, job_id, event, data):
+        """ジョブのイベントを追記"""
+        path = self._events_path(job_id)
+        line = json.dumps({'event': event, 'data': data}, ensure_ascii=False)
+        with self.lock:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+    def iter_events(self, job_id, start=0, poll_interval=0.2, keepalive_seconds=15, max_seconds=0):
+        """
+        ジョブのイベントを順に返すジェネレータ（ジョブの終了まで待機する）
+        (イベント番号, イベント名, データ)を返し、一定時間イベントがなければ(None, None, None)を返す
+        待機中はgetでジョブの状態を確認し、ワーカーが停止したジョブは失敗のイベントを返して終了する
+        max_secondsを指定すると、ジョブが終了していなくてもその秒数を過ぎた時点で終了する
+        """
+        path = self._events_path(job_id)
+        index = 0
+        offset = 0
+        started = time.monotonic()
+        last_sent = started
+        while True:
+            finished = False
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    f.seek(offset)
+                    while True:
+                        line = f.readline()
+                        if not line.endswith('\n'):
+                            break
+                        offset = f.tell()
+                        item = json.loads(line)
+                        if index >= start:
+                            yield index, item['event'], item['data']
+                            last_sent = time.monotonic()
+                        index += 1
+                        if item['event'] in ('completed', 'failed'):
+                            finished = True
+            if finished:
+                return
+
+            job = self.get(job_id)
+            if job is None or (job['status'] in ('completed', 'failed') and not os.path.exists(path)):
+                return
+            if max_seconds > 0 and time.monotonic() - started >= max_seconds:
+                return
+            if time.monotonic() - last_sent >= keepalive_seconds:
+                yield None, None, None
+                last_sent = time.monotonic()
+            time.sleep(poll_interval)
+
+    def _update(self, job_id, **fields):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            job['updated_at'] = datetime.now().isoformat()
+            self._save(job)
+
+    def _job_path(self, job_id):
+        # ジョブIDはuuid4の16進文字列のみ許可（パストラバーサル対策）
+        if not job_id or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        return os.path.join(self.job_folder, f"{job_id}.json")
+
+    def _key_path(self, key):
+        if not key or not all(c in '0123456789abcdef' for c in key):
+            return None
+        return os.path.join(self.job_folder, f"{key}.key")
+
+    def _events_path(self, job_id):
+        path = self._job_path(job_id)
+        return path[:-len('.json')] + '.events.jsonl' if path else None
+
+    def _save(self, job):
+        path = self._job_path(job['id'])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _load(self, job_id):
+        path = self._job_path(job_id)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"ジョブ読み込みエラー ({job_id}): {e}")
+            return None
+
+    def _cleanup(self):
+        """保持期間を過ぎたジョブファイルを削除"""
+        now = datetime.now().timestamp()
+        try:
+            for name in os.listdir(self.job_folder):
+                if not name.endswith(('.json', '.jsonl', '.key')):
+                    continue
+                path = os.path.join(self.job_folder, name)
+                if now - os.path.getmtime(path) > self.retention_seconds:
+                    os.remove(path)
+        except OSError as e:
+            print(f"ジョブ削除エラー: {e}")
@@ -0,0 +1,66 @@
+"""
+ページバッチ処理モジュール
+複数ページをトークン数の上限内で1回のBedrockリクエストにまとめ、
+ページ番号をキーにしたJSON形式の応答をページごとの結果に分割する
+"""
+import re
+import json
+
+# 画像1枚あたりの入力トークン数の目安（長辺1568px程度の画像で約1600トークン）
+IMAGE_TOKEN_ESTIMATE = 1600
+
+
+def estimate_tokens(text):
+    """
+    テキストのトークン数を概算
+    日本語などの非ASCII文字は1文字1トークン、ASCII文字は4文字1トークンとして数える
+    """
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return (len(text) - ascii_chars) + (ascii_chars + 3) // 4
+
+
+def make_batches(items, token_budget, max_items, size_func):
+    """itemsを順番を保ったまま、合計トークン数と件数の上限内のバッチに分割"""
+    batches = []
+    current = []
+    current_tokens = 0
+    for item in items:
+        tokens = size_func(item)
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_items):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(item)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_batch_response(text, page_numbers):
+    """
+    {"pages": {"1": "...", "2": "..."}} 形式の応答をページ番号ごとの結果に分割
+    解析できなかったページは結果に含めない（呼び出し側で個別に再実行する）
+    """
+    # コードブロックや前後の説明文を取り除く
+    match = re.search(r'\{.*\}', text, re.DOTALL)
+    if not match:
+        return {}
+    try:
+        # 文字列内にエスケープされていない改行が含まれる応答も受け付ける
+        data = json.loads(match.group(0), strict=False)
+    except ValueError:
+        return {}
+
+    pages = data.get('pages', data) if isinstance(data, dict) else {}
+    if not isinstance(pages, dict):
+        return {}
+
+    results = {}
+    for page_num in page_numbers:
+        value = pages.get(str(page_num))
+        if isinstance(value, (dict, list)):
+            value = json.dumps(value, ensure_ascii=False, indent=2)
+        if value:
+            results[page_num] = str(value)
+    return results
@@ -0,0 +1,105 @@
+"""
+ページ単位の並列処理モジュール
+Bedrockへのページごとのリクエストを同時実行数を制限しながら並列に送信する
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+
+# スロットリングとみなすBedrockのエラーコード
+THROTTLING_ERROR_CODES = ('ThrottlingException', 'TooManyRequestsException', 'ServiceUnavailableException')
+# スロットリング以外で再試行する一時的なエラーのコード
+TRANSIENT_ERROR_CODES = ('InternalServerException', 'ModelNotReadyException', 'ModelTimeoutException')
+
+
+def is_throttling_error(error):
+    """Bedrockのスロットリングエラーかどうかを判定"""
+    if not isinstance(error, ClientError):
+        return False
+    return error.response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
+
+def is_retryable_error(error):
+    """
+    再試行するエラー（スロットリング・一時的なサーバーエラー・通信エラー）かどうかを判定
+    通信エラーは接続失敗・タイムアウト（ConnectionError）と読み込み中の切断など（HTTPClientError）の両方を含む
+    """
+    if isinstance(error, (BotoConnectionError, HTTPClientError)):
+        return True
+    if not isinstance(error, ClientError):
+        return False
+    return is_throttling_error(error) or error.response.get('Error', {}).get('Code') in TRANSIENT_ERROR_CODES
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Bedrockへの同時リクエスト数を制御するリミッター
+    スロットリング時は上限を半減し、成功が続くと少しずつ上限を戻す（AIMD方式）
+    """
+    def __init__(self, max_concurrency, min_concurrency=1):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(self.max_concurrency)
+        self.active = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.active >= int(self.limit):
+                self.condition.wait()
+            self.active += 1
+
+    def release(self, throttled=False):
+        with self.condition:
+            self.active -= 1
+            if throttled:
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+    def call(self, func, max_retries=4, base_delay=1.0, before_attempt=None):
+        """
+        funcを同時実行数の範囲内で実行（スロットリング・一時的なエラーの場合はジッター付きで再試行）
+        Bedrockクライアント側では再試行しない設定にし、再試行とスロットリング時の上限の調整をここで一元的に行う
+        before_attemptは再試行を含む各送信の前、同時実行数の枠を確保する前に呼ばれる（レート制限の待機用）
+        """
+        attempt = 0
+        while True:
+            if before_attempt:
+                before_attempt()
+            self.acquire()
+            try:
+                result = func()
+            except Exception as e:
+                throttled = is_throttling_error(e)
+                self.release(throttled=throttled)
+                if not is_retryable_error(e) or attempt >= max_retries:
+                    raise
+                # フルジッター付き指数バックオフ
+                time.sleep(random.uniform(0, min(base_delay * (2 ** attempt), 30)))
+                attempt += 1
+                continue
+            self.release()
+            return result
+
+
+def map_in_order(func, items, max_workers, on_done=None):
+    """
+    itemsの各要素にfuncを並列に適用し、入力順に結果を返す
+    on_done(完了数, 総数)は各要素の完了時に呼ばれる
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    results = [None] * len(items)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as executor:
+        futures = {executor.submit(func, item): index for index, item in enumerate(items)}
+        for done, future in enumerate(as_completed(futures), 1):
+            results[futures[future]] = future.result()
+            if on_done:
+                on_done(done, len(items))
+    return results
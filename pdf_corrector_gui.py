@@ -9,20 +9,43 @@ import threading
 import os
 from datetime import datetime
 import webbrowser
-import boto3
-import json
-import base64
-import io
 import urllib3
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import fitz  # PyMuPDF
-from PIL import Image
+from bedrock_client import get_bedrock_client
 from pdf_corrector_module import PDFCorrector
-from config import Config
+from excel_export import write_corrections_excel
 
 # SSL証明書の警告を抑える（本番環境では適切な証明書を使用）
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+class GUIPDFCorrector(PDFCorrector):
+    """GUI版の校正処理（画像分析で文書全体の内容も詳しく報告する）"""
+    def build_image_prompt(self, page_num):
+        """画像分析用のプロンプトを作成"""
+        return f"""
+以下のPDFページ（ページ {page_num}）の画像を校正の観点から分析してください。
+
+画像の内容について以下の観点で分析し、詳細な報告をしてください：
+
+1. 文書の種類・目的
+2. レイアウト・構成の問題点
+3. テキスト内容の概要と校正すべき点
+4. 画像・図表の配置と内容
+5. 誤字脱字、文法ミス、表現の不自然さ
+6. **視覚的な問題の検出**：
+   - 不要な線、マーク、編集痕跡
+   - 取り消し線、斜線、余分な図形
+   - スキャン時の汚れ、ノイズ
+   - 文字の重複、欠損
+   - 色の不整合、コントラストの問題
+7. レイアウトの改善提案
+8. 全体的な校正提案
+
+特に視覚的な問題（不要な線、編集痕跡など）については、具体的な位置と改善方法を詳しく説明してください。
+
+日本語で回答してください。
+"""
+
+
 class PDFCorrectorGUI:
     def __init__(self, root):
         self.root = root
@@ -36,6 +59,7 @@ class PDFCorrectorGUI:
         self.corrector = None
         self.corrections = []
         self.excel_file = None
+        self.streaming_rows = {}  # 生成途中の結果の行（(段階, ページ) → [行ID, テキスト]）
         
         # 画像分析機能の変数
         self.analysis_mode = tk.StringVar(value="text")  # "text" or "image"
@@ -43,15 +67,9 @@ class PDFCorrectorGUI:
         self.bedrock_client = None
         self.ai_enabled = False
         
-        # AWS Bedrock設定
+        # AWS Bedrock設定（校正処理と共有するクライアント）
         try:
-            self.bedrock_client = boto3.client(
-                service_name='bedrock-runtime',
-                region_name=Config.AWS_DEFAULT_REGION,
-                aws_access_key_id=Config.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=Config.AWS_SECRET_ACCESS_KEY,
-                verify=True  # SSL証明書の検証を有効化
-            )
+            self.bedrock_client = get_bedrock_client()
             self.ai_enabled = True
         except Exception as e:
             print(f"AWS Bedrock設定エラー: {e}")
@@ -245,6 +263,11 @@ class PDFCorrectorGUI:
         self.process_button.config(state='disabled')
         self.download_button.config(state='disabled')
         
+        # 前回の結果をクリア（生成途中の結果を表示するため）
+        for item in self.result_tree.get_children():
+            self.result_tree.delete(item)
+        self.streaming_rows = {}
+        
         # プログレスバーを開始
         self.progress_bar.start()
         self.progress_var.set("校正処理中...")
@@ -261,34 +284,16 @@ class PDFCorrectorGUI:
             # 出力ディレクトリの作成
             os.makedirs('outputs', exist_ok=True)
             
-            # 統合分析（テキスト分析 + 画像分析）を実行
-            self.corrector = PDFCorrector()
-            text_corrections = self.corrector.process_pdf(
-                self.selected_file, 
-                progress_callback=self.update_progress
+            # 統合分析（テキスト分析 + 画像分析 + AI統合）を各1回ずつ実行
+            # AI機能が無効の場合はテキスト抽出のみを行う
+            self.corrector = GUIPDFCorrector()
+            self.corrections = self.corrector.run_pipeline(
+                self.selected_file,
+                progress_callback=self.update_progress,
+                use_ai=self.ai_enabled,
+                delta_callback=self.update_streaming_result
             )
             
-            # テキスト分析と画像分析を並列実行
-            if self.ai_enabled:
-                self.update_progress("テキスト分析と画像分析を並列実行中...")
-                
-                # 並列処理でテキスト分析と画像分析を同時実行
-                with ThreadPoolExecutor(max_workers=2) as executor:
-                    # テキスト分析と画像分析を同時に開始
-                    text_future = executor.submit(self.run_text_analysis_only)
-                    image_future = executor.submit(self.run_image_analysis)
-                    
-                    # 両方の完了を待機
-                    text_corrections = text_future.result()
-                    image_corrections = image_future.result()
-                
-                # AIでテキスト分析と画像分析の結果を統合
-                self.update_progress("AIで結果を統合中...")
-                self.corrections = self.integrate_analysis_results(text_corrections, image_corrections)
-            else:
-                # AI機能が無効の場合はテキスト分析のみ
-                self.corrections = text_corrections
-            
             # エクセルファイルの生成
             excel_filename = f"校正結果_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
             excel_path = os.path.join('outputs', excel_filename)
@@ -306,6 +311,23 @@ class PDFCorrectorGUI:
         """プログレス更新（別スレッドから呼び出し）"""
         self.root.after(0, lambda: self.progress_var.set(message))
     
+    def update_streaming_result(self, stage, page, text):
+        """生成途中の結果を更新（別スレッドから呼び出し）"""
+        self.root.after(0, lambda: self.append_streaming_result(stage, page, text))
+    
+    def append_streaming_result(self, stage, page, text):
+        """生成途中の結果を結果一覧の行に追記"""
+        key = (stage, page)
+        if key not in self.streaming_rows:
+            stage_names = {'text': 'テキスト', 'image': '画像', 'integrated': '校正'}
+            item_id = self.result_tree.insert('', 'end', values=(page, stage_names.get(stage, stage), '生成中...', ''))
+            self.streaming_rows[key] = [item_id, '']
+        item_id = self.streaming_rows[key][0]
+        self.streaming_rows[key][1] += text
+        correction = self.streaming_rows[key][1].replace('\n', ' ')
+        self.result_tree.set(item_id, '校正結果', '...' + correction[-100:] if len(correction) > 100 else correction)
+        self.result_tree.see(item_id)
+    
     def correction_completed(self):
         """校正完了時の処理"""
         self.progress_bar.stop()
@@ -334,9 +356,10 @@ class PDFCorrectorGUI:
     
     def display_results(self):
         """校正結果を表示"""
-        # 既存の結果をクリア
+        # 既存の結果（生成途中の結果を含む）をクリア
         for item in self.result_tree.get_children():
             self.result_tree.delete(item)
+        self.streaming_rows = {}
         
         # 結果を追加
         for correction in self.corrections:
@@ -347,6 +370,8 @@ class PDFCorrectorGUI:
                 type_name = '画像'
             elif correction['type'] == 'integrated':
                 type_name = '校正'
+            elif correction['type'] == 'rule':
+                type_name = 'ルール'
             elif correction['type'] == 'info':
                 type_name = '情報'
             else:
@@ -415,353 +440,14 @@ class PDFCorrectorGUI:
         self.status_var.set("結果をクリアしました")
         self.progress_var.set("待機中...")
     
-    def run_image_analysis(self):
-        """画像分析処理の実行（並列処理用）"""
-        try:
-            # PyMuPDFでPDFを開く
-            self.root.after(0, lambda: self.update_progress("PDFを画像に変換中..."))
-            doc = fitz.open(self.selected_file)
-            
-            # 最大ページ数制限
-            max_pages = min(len(doc), Config.MAX_PDF_PAGES)
-            
-            corrections = []
-            for page_num in range(max_pages):
-                display_page = page_num + 1
-                self.root.after(0, lambda msg=f"ページ {display_page} をAI分析中...": self.update_progress(msg))
-                
-                # PDFページを画像に変換（dpi=200相当）
-                page = doc[page_num]
-                zoom = 200 / 72  # 72 DPIが基本
-                matrix = fitz.Matrix(zoom, zoom)
-                pix = page.get_pixmap(matrix=matrix)
-                
-                # PyMuPDFのPixmapをPIL Imageに変換
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                
-                # 画像をbase64エンコード
-                img_buffer = io.BytesIO()
-                img.save(img_buffer, format='PNG')
-                img_base64 = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
-                
-                # AI分析
-                analysis_result = self.analyze_image_with_claude(img_base64, display_page)
-                corrections.append({
-                    'type': 'image',
-                    'page': display_page,
-                    'content': f"ページ {display_page} の画像分析（視覚的問題検出含む）",
-                    'correction': analysis_result
-                })
-            
-            doc.close()
-            return corrections
-            
-        except Exception as e:
-            raise Exception(f"画像分析中にエラーが発生しました: {str(e)}")
-    
-    def run_text_analysis_only(self):
-        """テキスト分析のみを実行（並列処理用）"""
-        try:
-            self.root.after(0, lambda: self.update_progress("テキスト分析を実行中..."))
-            
-            # PDFCorrectorを使用してテキスト分析のみ実行
-            text_corrections = self.corrector.process_pdf(
-                self.selected_file, 
-                progress_callback=lambda msg: self.root.after(0, lambda: self.update_progress(f"テキスト分析: {msg}"))
-            )
-            
-            return text_corrections
-            
-        except Exception as e:
-            self.root.after(0, lambda: self.update_progress(f"テキスト分析エラー: {str(e)}"))
-            return []
-    
-    def analyze_image_with_claude(self, image_base64, page_num):
-        """Claude 3.5 Sonnet v2で画像を分析"""
-        try:
-            prompt = f"""
-以下のPDFページ（ページ {page_num}）の画像を校正の観点から分析してください。
-
-画像の内容について以下の観点で分析し、詳細な報告をしてください：
-
-1. 文書の種類・目的
-2. レイアウト・構成の問題点
-3. テキスト内容の概要と校正すべき点
-4. 画像・図表の配置と内容
-5. 誤字脱字、文法ミス、表現の不自然さ
-6. **視覚的な問題の検出**：
-   - 不要な線、マーク、編集痕跡
-   - 取り消し線、斜線、余分な図形
-   - スキャン時の汚れ、ノイズ
-   - 文字の重複、欠損
-   - 色の不整合、コントラストの問題
-7. レイアウトの改善提案
-8. 全体的な校正提案
-
-特に視覚的な問題（不要な線、編集痕跡など）については、具体的な位置と改善方法を詳しく説明してください。
-
-日本語で回答してください。
-"""
-
-            body = json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 2500,
-                "temperature": Config.TEMPERATURE,
-                "top_p": Config.TOP_P,
-                "top_k": Config.TOP_K,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": prompt
-                            },
-                            {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": "image/png",
-                                    "data": image_base64
-                                }
-                            }
-                        ]
-                    }
-                ]
-            })
-
-            response = self.bedrock_client.invoke_model(
-                modelId=Config.BEDROCK_MODEL_ID,
-                contentType="application/json",
-                accept="application/json",
-                body=body
-            )
-
-            response_body = json.loads(response['body'].read())
-            return response_body['content'][0]['text']
-            
-        except Exception as e:
-            return f"AI分析エラー: {str(e)}"
-    
     def export_image_analysis_to_excel(self, output_path):
         """画像分析結果をエクセルに出力"""
-        import openpyxl
-        from openpyxl.styles import Font, PatternFill
-        
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "校正結果（画像分析）"
-        
-        # ヘッダー設定
-        headers = ['ページ', 'タイプ', '内容', '校正結果']
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-        
-        # データ入力
-        for row, correction in enumerate(self.corrections, 2):
-            # タイプの表示名を決定
-            if correction['type'] == 'text':
-                type_name = 'テキスト'
-            elif correction['type'] == 'image':
-                type_name = '画像'
-            elif correction['type'] == 'info':
-                type_name = '情報'
-            else:
-                type_name = correction['type']
-            
-            ws.cell(row=row, column=1, value=correction['page'])
-            ws.cell(row=row, column=2, value=type_name)
-            ws.cell(row=row, column=3, value=correction['content'])
-            ws.cell(row=row, column=4, value=correction['correction'])
-        
-        # 列幅調整
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        wb.save(output_path)
+        write_corrections_excel(self.corrections, output_path, title="校正結果（画像分析）")
     
     def export_combined_analysis_to_excel(self, output_path):
         """統合分析結果（テキスト+画像）をエクセルに出力"""
-        import openpyxl
-        from openpyxl.styles import Font, PatternFill
-        
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "校正結果"
-        
-        # ヘッダー設定
-        headers = ['ページ', 'タイプ', '内容', '校正結果']
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-        
-        # データ入力
-        for row, correction in enumerate(self.corrections, 2):
-            # タイプの表示名を決定
-            if correction['type'] == 'text':
-                type_name = 'テキスト'
-            elif correction['type'] == 'image':
-                type_name = '画像'
-            elif correction['type'] == 'integrated':
-                type_name = '校正'
-            elif correction['type'] == 'info':
-                type_name = '情報'
-            else:
-                type_name = correction['type']
-            
-            ws.cell(row=row, column=1, value=correction['page'])
-            ws.cell(row=row, column=2, value=type_name)
-            ws.cell(row=row, column=3, value=correction['content'])
-            ws.cell(row=row, column=4, value=correction['correction'])
-        
-        # 列幅調整
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        wb.save(output_path)
-    
-    def integrate_analysis_results(self, text_corrections, image_corrections):
-        """AIでテキスト分析と画像分析の結果を統合"""
-        try:
-            # ページごとにグループ化
-            page_groups = {}
-            
-            # テキスト分析結果をページごとにグループ化
-            for correction in text_corrections:
-                page = correction['page']
-                if page not in page_groups:
-                    page_groups[page] = {'text': [], 'image': []}
-                page_groups[page]['text'].append(correction)
-            
-            # 画像分析結果をページごとにグループ化
-            for correction in image_corrections:
-                page = correction['page']
-                if page not in page_groups:
-                    page_groups[page] = {'text': [], 'image': []}
-                page_groups[page]['image'].append(correction)
-            
-            # 各ページの結果をAIで統合
-            integrated_results = []
-            for page_num in sorted(page_groups.keys()):
-                if page_num == 0:  # 情報項目はスキップ
-                    continue
-                    
-                self.root.after(0, lambda msg=f"ページ {page_num} の結果を分析中...": self.update_progress(msg))
-                
-                text_results = page_groups[page_num]['text']
-                image_results = page_groups[page_num]['image']
-                
-                # AIで統合
-                integrated_result = self.integrate_page_results_with_ai(page_num, text_results, image_results)
-                integrated_results.append(integrated_result)
-            
-            return integrated_results
-            
-        except Exception as e:
-            # エラーの場合は元の結果をそのまま返す
-            print(f"統合処理エラー: {e}")
-            return text_corrections + image_corrections
-    
-    def integrate_page_results_with_ai(self, page_num, text_results, image_results):
-        """AIでページのテキスト分析と画像分析結果を統合"""
-        try:
-            # テキスト分析結果をまとめる
-            text_summary = ""
-            for result in text_results:
-                text_summary += f"テキスト分析: {result['correction']}\n\n"
-            
-            # 画像分析結果をまとめる
-            image_summary = ""
-            for result in image_results:
-                image_summary += f"画像分析: {result['correction']}\n\n"
-            
-            prompt = f"""
-以下のページ {page_num} のテキスト分析と画像分析の結果を統合し、重複を排除して最適化された校正結果を生成してください。
-
-テキスト分析結果:
-{text_summary}
-
-画像分析結果:
-{image_summary}
-
-統合の指示:
-1. 重複する指摘を統合し、1つの明確な指摘にまとめる
-2. テキスト分析と画像分析の結果を相互補完的に統合する
-3. 優先度の高い問題から順に整理する
-4. 具体的で実行可能な修正提案を提供する
-5. 視覚的な問題とテキストの問題を適切に組み合わせる
-
-以下の形式で校正結果を提供してください:
-
-【校正結果】
-- 問題1: [具体的な問題と修正提案]
-- 問題2: [具体的な問題と修正提案]
-- 問題3: [具体的な問題と修正提案]
-...
-
-日本語で回答してください。
-"""
-
-            body = json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 2000,
-                "temperature": Config.TEMPERATURE,
-                "top_p": Config.TOP_P,
-                "top_k": Config.TOP_K,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            })
-
-            response = self.bedrock_client.invoke_model(
-                modelId=Config.BEDROCK_MODEL_ID,
-                contentType="application/json",
-                accept="application/json",
-                body=body
-            )
-
-            response_body = json.loads(response['body'].read())
-            integrated_correction = response_body['content'][0]['text']
-            
-            return {
-                'type': 'integrated',
-                'page': page_num,
-                'content': f"ページ {page_num} の校正結果",
-                'correction': integrated_correction
-            }
-            
-        except Exception as e:
-            # エラーの場合は元の結果をそのまま返す
-            return {
-                'type': 'integrated',
-                'page': page_num,
-                'content': f"ページ {page_num} の校正結果（エラーにより統合失敗）",
-                'correction': f"統合処理中にエラーが発生しました: {str(e)}\n\nテキスト分析結果:\n{text_summary}\n\n画像分析結果:\n{image_summary}"
-            }
+        self.corrector.corrections = self.corrections
+        self.corrector.export_to_excel(output_path)
 
 def main():
     """メイン関数"""
@@ -3,76 +3,259 @@ PDF校正モジュール
 既存のapp.pyからPDFCorrectorクラスを分離して再利用可能にしたもの
 """
 import os
-import boto3
+import re
 import json
+import time
+import threading
 from datetime import datetime
-import openpyxl
-from openpyxl.styles import Font, PatternFill
-import pdfplumber
-import fitz  # PyMuPDF
-from PIL import Image
-import io
+import uuid
 import base64
 import urllib3
+from concurrent.futures import ThreadPoolExecutor
 from config import Config
+from excel_export import write_corrections_excel
+from bedrock_cache import BedrockResultCache
+from bedrock_client import get_bedrock_client
+from bedrock_rate_limiter import BedrockRateLimiter, SharedTokenBucket, TokenBucket, estimate_request_tokens
+from page_batching import IMAGE_TOKEN_ESTIMATE, estimate_tokens, make_batches, parse_batch_response
+from page_concurrency import AdaptiveConcurrencyLimiter, map_in_order
+from text_chunking import chunk_text
+from pdf_document import ParsedDocument
+from pdf_process_pool import ProcessPoolDocument
+import proofing_rules
+from proofing_rules import needs_llm_check
+from pipeline_checkpoint import PipelineCheckpoint, document_checkpoint_key
+from pipeline_metrics import JobMetrics
 
 # SSL証明書の警告を抑える（本番環境では適切な証明書を使用）
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# プロセス内のすべてのPDFCorrectorで共有するBedrock同時実行数リミッター
+bedrock_limiter = AdaptiveConcurrencyLimiter(Config.BEDROCK_MAX_CONCURRENCY)
+
+# RPM・TPMのレート制限（上限が設定された場合のみ、状態ファイルを指定するとプロセス間で共有）
+bedrock_rate_limiter = None
+if Config.BEDROCK_REQUESTS_PER_MINUTE > 0 or Config.BEDROCK_TOKENS_PER_MINUTE > 0:
+    if Config.RATE_LIMIT_STATE_FILE:
+        rate_bucket = SharedTokenBucket(
+            Config.RATE_LIMIT_STATE_FILE,
+            Config.BEDROCK_REQUESTS_PER_MINUTE,
+            Config.BEDROCK_TOKENS_PER_MINUTE,
+            Config.RATE_LIMIT_BURST_SECONDS
+        )
+    else:
+        rate_bucket = TokenBucket(
+            Config.BEDROCK_REQUESTS_PER_MINUTE,
+            Config.BEDROCK_TOKENS_PER_MINUTE,
+            Config.RATE_LIMIT_BURST_SECONDS
+        )
+    bedrock_rate_limiter = BedrockRateLimiter(
+        rate_bucket,
+        Config.RATE_LIMIT_SMALL_DOCUMENT_PAGES,
+        Config.RATE_LIMIT_SMALL_DOCUMENT_WEIGHT
+    )
+
+# Bedrock応答キャッシュ（TEMPERATURE=0.0のため同じリクエストには同じ応答を再利用できる）
+bedrock_cache = None
+if Config.BEDROCK_CACHE_ENABLED:
+    bedrock_cache = BedrockResultCache(
+        Config.BEDROCK_CACHE_PATH,
+        Config.BEDROCK_CACHE_TTL_SECONDS,
+        Config.BEDROCK_CACHE_MAX_BYTES,
+        Config.PROMPT_TEMPLATE_VERSION
+    )
+
+# Bedrockの呼び出しに失敗した場合に各メソッドが返すエラーの結果（チャンクごとの結果に含まれる場合も検出する）
+ERROR_RESULT_PATTERN = re.compile(r'^(AI校正エラー|画像分析エラー): ', re.MULTILINE)
+
 class PDFCorrector:
     def __init__(self):
         self.corrections = []
-        # AWS Bedrock設定
-        self.bedrock_client = boto3.client(
-            service_name='bedrock-runtime',
-            region_name=Config.AWS_DEFAULT_REGION,
-            aws_access_key_id=Config.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=Config.AWS_SECRET_ACCESS_KEY,
-            verify=True  # SSL証明書の検証を有効化
-        )
+        # 分析が完了しなかったページ（改訂履歴・チェックポイントに保存せず、次回も再分析する）
+        self.failed_pages = set()
+        # 各段階の処理時間・トークン数の計測結果
+        self.metrics = JobMetrics()
+        # レート制限の順番待ちでジョブを区別するキーと、優先度に使う文書のページ数
+        self.job_key = uuid.uuid4().hex
+        self.document_pages = None
+        # AWS Bedrockクライアント（指定しない場合はプロセス全体で共有するクライアントを最初の呼び出し時に取得）
+        self._bedrock_client = None
+    
+    @property
+    def bedrock_client(self):
+        """
+        AWS Bedrockクライアント
+        AI校正を行わない場合はクライアントを作成しないため、認証情報がなくても処理できる
+        """
+        if self._bedrock_client is None:
+            self._bedrock_client = get_bedrock_client()
+        return self._bedrock_client
+    
+    @bedrock_client.setter
+    def bedrock_client(self, client):
+        self._bedrock_client = client
+    
+    def _invoke_model(self, body, on_delta=None, operation='model'):
+        """
+        Bedrockを呼び出してレスポンスボディを返す（キャッシュ・同時実行数制御・スロットリング時の再試行付き）
+        on_deltaを指定するとストリーミングで呼び出し、生成途中のテキストを順に渡す
+        （再試行した場合は最初から渡し直すため、表示は最終結果で置き換えること）
+        operationは計測結果の集計に使う呼び出しの種類
+        レート制限が有効な場合は、再試行を含む各送信の前にジョブごとの順番とRPM・TPMの枠を待つ
+        """
+        cache_key = None
+        if bedrock_cache:
+            cache_key = bedrock_cache.make_key(Config.BEDROCK_MODEL_ID, body)
+            cached = bedrock_cache.get(cache_key)
+            if cached is not None:
+                self.metrics.record_model_call(operation, 0, len(body), cached=True)
+                if on_delta and cached.get('content'):
+                    on_delta(cached['content'][0]['text'])
+                return cached
+        
+        # レート制限は再試行を含む各送信の前に、同時実行数の枠を確保したまま待たないようリミッターの外側で待つ
+        estimated_tokens = estimate_request_tokens(body) if bedrock_rate_limiter else 0
+        
+        def wait_for_rate_limit():
+            bedrock_rate_limiter.acquire(self.job_key, estimated_tokens, self.document_pages)
+        
+        def invoke():
+            try:
+                if on_delta and Config.BEDROCK_STREAMING_ENABLED:
+                    response = self.bedrock_client.invoke_model_with_response_stream(
+                        modelId=Config.BEDROCK_MODEL_ID,
+                        contentType="application/json",
+                        accept="application/json",
+                        body=body
+                    )
+                    return self._read_response_stream(response, on_delta)
+                response = self.bedrock_client.invoke_model(
+                    modelId=Config.BEDROCK_MODEL_ID,
+                    contentType="application/json",
+                    accept="application/json",
+                    body=body
+                )
+                return json.loads(response['body'].read())
+            except Exception:
+                # 失敗した送信で確保したトークンは返却する（リクエスト数は消費したまま）
+                if bedrock_rate_limiter:
+                    bedrock_rate_limiter.complete(estimated_tokens, 0)
+                raise
+        
+        start = time.perf_counter()
+        try:
+            response_body = bedrock_limiter.call(invoke, Config.BEDROCK_MAX_RETRIES, Config.BEDROCK_RETRY_BASE_DELAY,
+                                                 wait_for_rate_limit if bedrock_rate_limiter else None)
+        except Exception:
+            self.metrics.record_model_call(operation, time.perf_counter() - start, len(body), error=True)
+            raise
+        usage = response_body.get('usage') or {}
+        if bedrock_rate_limiter and usage:
+            # 見積もり（出力は上限値）を実際のトークン数に合わせる
+            bedrock_rate_limiter.complete(estimated_tokens, usage.get('input_tokens', 0) + usage.get('output_tokens', 0))
+        self.metrics.record_model_call(operation, time.perf_counter() - start, len(body), response_body.get('usage'))
+        if cache_key and response_body.get('content'):
+            bedrock_cache.set(cache_key, response_body)
+        return response_body
+    
+    def _read_response_stream(self, response, on_delta):
+        """
+        ストリーミングのレスポンスを読み取り、invoke_modelと同じ形式のレスポンスボディを組み立てる
+        生成途中のテキストは一定間隔でまとめてon_deltaに渡す
+        """
+        text_parts = []
+        pending = []
+        usage = {}
+        stop_reason = None
+        last_flush = time.monotonic()
+        for event in response['body']:
+            chunk = event.get('chunk')
+            if not chunk:
+                continue
+            data = json.loads(chunk['bytes'])
+            if data['type'] == 'message_start':
+                usage.update(data['message'].get('usage', {}))
+            elif data['type'] == 'content_block_delta' and data['delta'].get('type') == 'text_delta':
+                text_parts.append(data['delta']['text'])
+                pending.append(data['delta']['text'])
+                if time.monotonic() - last_flush >= Config.BEDROCK_STREAM_FLUSH_SECONDS:
+                    on_delta(''.join(pending))
+                    pending = []
+                    last_flush = time.monotonic()
+            elif data['type'] == 'message_delta':
+                usage.update(data.get('usage', {}))
+                stop_reason = data['delta'].get('stop_reason')
+        if pending:
+            on_delta(''.join(pending))
+        
+        return {
+            'type': 'message',
+            'role': 'assistant',
+            'content': [{'type': 'text', 'text': ''.join(text_parts)}],
+            'stop_reason': stop_reason,
+            'usage': usage
+        }
+    
+    def open_document(self, pdf_path):
+        """
+        PDFを開いて各処理で共有する文書オブジェクトを返す（最大ページ数まで、0以下は無制限）
+        プロセスプールが有効な場合、テキスト抽出・レンダリングは別プロセスで実行する
+        """
+        max_pages = Config.MAX_PDF_PAGES if Config.MAX_PDF_PAGES > 0 else None
+        with self.metrics.stage('open'):
+            if Config.PROCESS_POOL_ENABLED:
+                document = ProcessPoolDocument(pdf_path, max_pages, Config.PROCESS_POOL_WORKERS)
+            else:
+                document = ParsedDocument(pdf_path, max_pages)
+        self.document_pages = document.page_count
+        return document
+    
+    def _as_document(self, pdf):
+        """パスが渡された場合は文書を開く（戻り値の2番目は呼び出し側で閉じる必要があるか）"""
+        if isinstance(pdf, ParsedDocument):
+            return pdf, False
+        return self.open_document(pdf), True
     
-    def extract_text_from_pdf(self, pdf_path):
-        """PDFからテキストを抽出（最大3ページまで）"""
+    def extract_text_from_pdf(self, pdf_path, pages=None):
+        """PDFからテキストを抽出（最大ページ数まで、pagesを指定した場合はそのページのみ）"""
         text_content = []
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                max_pages = min(len(pdf.pages), Config.MAX_PDF_PAGES)
-                for page_num in range(max_pages):
-                    page = pdf.pages[page_num]
-                    text = page.extract_text()
-                    if text:
-                        text_content.append({
-                            'page': page_num + 1,
-                            'text': text
-                        })
+            document, owned = self._as_document(pdf_path)
+            try:
+                with self.metrics.stage('extract_text') as record:
+                    for page_num in (document.page_numbers if pages is None else pages):
+                        text = document.get_text(page_num)
+                        if text:
+                            text_content.append({
+                                'page': page_num,
+                                'text': text
+                            })
+                            record['bytes'] += len(text.encode('utf-8'))
+            finally:
+                if owned:
+                    document.close()
         except Exception as e:
             print(f"PDF読み込みエラー: {e}")
         return text_content
     
-    def extract_images_from_pdf(self, pdf_path):
-        """PDFから画像を抽出（最大3ページまで）"""
+    def extract_images_from_pdf(self, pdf_path, pages=None):
+        """PDFから画像を抽出（最大ページ数まで、pagesを指定した場合はそのページのみ）"""
         images = []
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                max_pages = min(len(pdf.pages), Config.MAX_PDF_PAGES)
-                for page_num in range(max_pages):
-                    page = pdf.pages[page_num]
-                    page_images = page.images
-                    for img in page_images:
-                        images.append({
-                            'page': page_num + 1,
-                            'bbox': img['bbox'],
-                            'x0': img['x0'],
-                            'y0': img['y0'],
-                            'x1': img['x1'],
-                            'y1': img['y1']
-                        })
+            document, owned = self._as_document(pdf_path)
+            try:
+                with self.metrics.stage('extract_images'):
+                    for page_num in (document.page_numbers if pages is None else pages):
+                        images.extend(document.get_images(page_num))
+            finally:
+                if owned:
+                    document.close()
         except Exception as e:
             print(f"画像抽出エラー: {e}")
         return images
     
-    def check_with_claude(self, content, content_type="text"):
-        """Claude 3.5 Sonnet v2で校正チェック"""
+    def check_with_claude(self, content, content_type="text", on_delta=None):
+        """Claude 3.5 Sonnet v2で校正チェック（on_deltaには生成途中のテキストが渡される）"""
         try:
             if content_type == "text":
                 prompt = f"""
@@ -101,7 +284,7 @@ class PDFCorrector:
 
             body = json.dumps({
                 "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 1000,
+                "max_tokens": Config.TEXT_MAX_TOKENS,
                 "temperature": Config.TEMPERATURE,
                 "top_p": Config.TOP_P,
                 "top_k": Config.TOP_K,
@@ -113,155 +296,518 @@ class PDFCorrector:
                 ]
             })
 
-            response = self.bedrock_client.invoke_model(
-                modelId=Config.BEDROCK_MODEL_ID,
-                contentType="application/json",
-                accept="application/json",
-                body=body
-            )
-
-            response_body = json.loads(response['body'].read())
+            response_body = self._invoke_model(body, on_delta, operation="text" if content_type == "text" else "image_info")
             return response_body['content'][0]['text']
             
         except Exception as e:
             return f"AI校正エラー: {str(e)}"
     
-    def process_pdf(self, pdf_path, progress_callback=None):
-        """PDFを処理して校正結果を生成"""
+    def check_page_text(self, text, on_delta=None):
+        """
+        ページのテキストを校正
+        長いページは文の境界でチャンクに分割して並列に校正し、ページ内の文字位置を付けて結果をまとめる
+        （チャンクの結果は並列に生成されるため、on_deltaはチャンクに分割しない場合のみ使用する）
+        """
+        chunks = chunk_text(text, Config.CHUNK_TOKEN_BUDGET, Config.CHUNK_OVERLAP_TOKENS)
+        if len(chunks) == 1:
+            return self.check_with_claude(text, "text", on_delta)
+        
+        results = map_in_order(lambda chunk: self.check_with_claude(chunk[2], "text"), chunks, Config.PAGE_CONCURRENCY)
+        return "\n\n".join(
+            f"【{start + 1}〜{end}文字目】\n{result}" for (start, end, _), result in zip(chunks, results)
+        )
+    
+    def check_with_rules(self, item):
+        """ページのテキストをルールでチェック（指摘がなければNone）"""
+        findings = proofing_rules.check_text(item['text'])
+        if not findings:
+            return None
+        return {
+            'type': 'rule',
+            'page': item['page'],
+            'content': f"ルールチェック（{len(findings)}件）",
+            'correction': "\n".join(f"- {finding}" for finding in findings)
+        }
+    
+    def _mark_failed(self, entry):
+        """結果がBedrockの呼び出しエラーの場合は'failed'を付ける"""
+        if ERROR_RESULT_PATTERN.search(entry['correction']):
+            entry['failed'] = True
+        return entry
+    
+    def text_entry(self, item, correction):
+        """テキスト校正の結果項目を作成"""
+        return self._mark_failed({
+            'type': 'text',
+            'page': item['page'],
+            'content': item['text'][:100] + '...' if len(item['text']) > 100 else item['text'],
+            'correction': correction
+        })
+    
+    def image_info_entry(self, img, correction):
+        """画像配置チェックの結果項目を作成"""
+        return self._mark_failed({
+            'type': 'image',
+            'page': img['page'],
+            'content': f"画像位置: ({img['x0']}, {img['y0']}) - ({img['x1']}, {img['y1']})",
+            'correction': correction
+        })
+    
+    def image_analysis_entry(self, page_num, correction):
+        """画像分析の結果項目を作成"""
+        return self._mark_failed({
+            'type': 'image',
+            'page': page_num,
+            'content': f"ページ {page_num} の画像分析",
+            'correction': correction
+        })
+    
+    def check_pages_batch_with_claude(self, items):
+        """
+        複数ページのテキストを1回のリクエストで校正し、ページ番号ごとの結果を返す
+        応答を解析できなかったページは個別に校正し直す
+        """
+        page_numbers = [item['page'] for item in items]
+        pages_text = "\n\n".join(f"=== ページ {item['page']} ===\n{item['text']}" for item in items)
+        prompt = f"""
+以下の複数ページのテキストをページごとに校正してください。誤字脱字、文法ミス、表現の不自然さなどをチェックし、修正提案をしてください。
+
+{pages_text}
+
+各ページの校正結果を、ページ番号をキーにした次のJSON形式のみで回答してください（JSON以外の文章は不要です）:
+{{"pages": {{"{page_numbers[0]}": "- 誤字脱字: ...\\n- 文法・表現: ...\\n- その他: ...", ...}}}}
+"""
+        try:
+            body = json.dumps({
+                "anthropic_version": "bedrock-2023-05-31",
+                "max_tokens": min(Config.TEXT_MAX_TOKENS * len(items), Config.BATCH_MAX_OUTPUT_TOKENS),
+                "temperature": Config.TEMPERATURE,
+                "top_p": Config.TOP_P,
+                "top_k": Config.TOP_K,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ]
+            })
+            
+            response_body = self._invoke_model(body, operation="text_batch")
+            results = parse_batch_response(response_body['content'][0]['text'], page_numbers)
+        except Exception as e:
+            print(f"バッチ校正エラー: {e}")
+            results = {}
+        
+        for item in items:
+            if item['page'] not in results:
+                results[item['page']] = self.check_page_text(item['text'])
+        return results
+    
+    def process_pdf(self, pdf_path, progress_callback=None, pages=None, result_callback=None, delta_callback=None,
+                    page_done_callback=None):
+        """
+        PDFを処理して校正結果を生成（pdf_pathにはParsedDocumentも指定可能）
+        result_callbackには各ページの校正結果が完了した順に渡される
+        delta_callback(ページ番号, テキスト)には各ページの生成途中のテキストが渡される
+        page_done_callback(ページ番号)はそのページの結果が全て出揃った時点で呼ばれる
+        """
         self.corrections = []
         
         # テキスト抽出と校正
         if progress_callback:
             progress_callback("テキストを抽出中...")
         
-        text_content = self.extract_text_from_pdf(pdf_path)
-        for i, item in enumerate(text_content):
+        document, owned = self._as_document(pdf_path)
+        try:
+            target_pages = list(document.page_numbers if pages is None else pages)
+            text_content = self.extract_text_from_pdf(document, pages)
+            images = self.extract_images_from_pdf(document, pages)
+        finally:
+            if owned:
+                document.close()
+        
+        # ルールベースの事前チェック（AIを使わずに検出できる指摘を追加し、AI校正が不要なページを除外）
+        if Config.RULE_CHECK_ENABLED:
             if progress_callback:
-                progress_callback(f"テキスト校正中... ({i+1}/{len(text_content)})")
-            
-            correction = self.check_with_claude(item['text'], "text")
-            self.corrections.append({
-                'type': 'text',
-                'page': item['page'],
-                'content': item['text'][:100] + '...' if len(item['text']) > 100 else item['text'],
-                'correction': correction
-            })
+                progress_callback("ルールチェック中...")
+            for item in text_content:
+                rule_entry = self.check_with_rules(item)
+                if rule_entry:
+                    self.corrections.append(rule_entry)
+                    if result_callback:
+                        result_callback(rule_entry)
+            if Config.RULE_SKIP_LLM_ENABLED:
+                text_content = [item for item in text_content if needs_llm_check(item['text'])]
+        
+        # ページごとの未完了の校正数（0になったページから完了を通知する）
+        pending_counts = {page_num: 0 for page_num in target_pages}
+        pending_lock = threading.Lock()
+        for entry in text_content + images:
+            pending_counts[entry['page']] += 1
+        
+        def finish_page(page_num):
+            with pending_lock:
+                pending_counts[page_num] -= 1
+                done = pending_counts[page_num] == 0
+            if done and page_done_callback:
+                page_done_callback(page_num)
+        
+        if page_done_callback:
+            for page_num, count in pending_counts.items():
+                if count == 0:
+                    page_done_callback(page_num)
+        
+        def text_entry(item, correction):
+            result = self.text_entry(item, correction)
+            if result_callback:
+                result_callback(result)
+            finish_page(item['page'])
+            return result
+        
+        def check_text(item):
+            on_delta = None
+            if delta_callback:
+                on_delta = lambda delta: delta_callback(item['page'], delta)
+            return [text_entry(item, self.check_page_text(item['text'], on_delta))]
+        
+        def check_text_batch(batch):
+            if len(batch) == 1:
+                return check_text(batch[0])
+            results = self.check_pages_batch_with_claude(batch)
+            return [text_entry(item, results[item['page']]) for item in batch]
         
-        # 画像抽出と校正
+        def on_text_done(done, total):
+            if progress_callback:
+                progress_callback(f"テキスト校正中... ({done}/{total})")
+        
+        # ページごとのテキスト校正を並列実行（結果はページ順）
+        # バッチモードでは複数ページを1回のリクエストにまとめる
+        if Config.BATCH_ENABLED and len(text_content) > 1:
+            batches = make_batches(text_content, Config.BATCH_TOKEN_BUDGET, Config.BATCH_MAX_PAGES,
+                                   lambda item: estimate_tokens(item['text']))
+            text_results = map_in_order(check_text_batch, batches, Config.PAGE_CONCURRENCY, on_text_done)
+        else:
+            text_results = map_in_order(check_text, text_content, Config.PAGE_CONCURRENCY, on_text_done)
+        for entries in text_results:
+            self.corrections.extend(entries)
+        
+        # 画像情報の校正
         if progress_callback:
-            progress_callback("画像情報を抽出中...")
+            progress_callback("画像情報を校正中...")
         
-        images = self.extract_images_from_pdf(pdf_path)
-        for i, img in enumerate(images):
+        def check_image(img):
+            result = self.image_info_entry(img, self.check_with_claude(str(img), "image"))
+            if result_callback:
+                result_callback(result)
+            finish_page(img['page'])
+            return result
+        
+        def on_image_done(done, total):
             if progress_callback:
-                progress_callback(f"画像校正中... ({i+1}/{len(images)})")
-            
-            correction = self.check_with_claude(str(img), "image")
-            self.corrections.append({
-                'type': 'image',
-                'page': img['page'],
-                'content': f"画像位置: ({img['x0']}, {img['y0']}) - ({img['x1']}, {img['y1']})",
-                'correction': correction
-            })
+                progress_callback(f"画像校正中... ({done}/{total})")
+        
+        self.corrections.extend(map_in_order(check_image, images, Config.PAGE_CONCURRENCY, on_image_done))
         
         if progress_callback:
             progress_callback("校正完了！")
         
         return self.corrections
     
-    def export_to_excel(self, output_path):
-        """校正結果をエクセルに出力"""
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "校正結果"
-        
-        # ヘッダー設定
-        headers = ['ページ', 'タイプ', '内容', '校正結果']
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-        
-        # データ入力
-        for row, correction in enumerate(self.corrections, 2):
-            # タイプの表示名を決定
-            if correction['type'] == 'text':
-                type_name = 'テキスト'
-            elif correction['type'] == 'image':
-                type_name = '画像'
-            elif correction['type'] == 'integrated':
-                type_name = '校正'
-            elif correction['type'] == 'info':
-                type_name = '情報'
+    def fingerprint_pages(self, document):
+        """各ページの指紋（テキストと低解像度画像のハッシュ）を取得"""
+        return {page_num: document.page_fingerprint(page_num) for page_num in document.page_numbers}
+    
+    def _reusable_corrections(self, fingerprints, previous_pages):
+        """
+        前回の版と指紋が同じページの校正結果を、今回のページ番号に付け替えて返す（{ページ番号: 校正結果の一覧}）
+        指紋で対応付けるため、ページの挿入・削除で番号がずれたページも再利用できる
+        """
+        def key(fingerprint):
+            return json.dumps(fingerprint, sort_keys=True)
+        
+        previous_by_fingerprint = {}
+        for previous in previous_pages.values():
+            if previous.get('fingerprint'):
+                previous_by_fingerprint.setdefault(key(previous['fingerprint']), previous.get('corrections', []))
+        reusable = {}
+        for page_num, fingerprint in fingerprints.items():
+            corrections = previous_by_fingerprint.get(key(fingerprint))
+            if corrections is not None:
+                reusable[page_num] = [dict(correction, page=page_num) for correction in corrections]
+        return reusable
+    
+    def find_changed_pages(self, fingerprints, previous_pages):
+        """
+        前回の版と指紋を比較し、再分析が必要なページと再利用できる校正結果を返す
+        previous_pagesはRevisionStore.loadの戻り値
+        """
+        reusable = self._reusable_corrections(fingerprints, previous_pages)
+        changed_pages = []
+        reused_corrections = []
+        for page_num in fingerprints:
+            if page_num in reusable:
+                for correction in reusable[page_num]:
+                    reused = dict(correction)
+                    reused['content'] = f"{correction['content']}（前回の版から変更なし）"
+                    reused_corrections.append(reused)
+            else:
+                changed_pages.append(page_num)
+        return changed_pages, reused_corrections
+    
+    def build_revision_pages(self, fingerprints, corrections, previous_pages):
+        """
+        今回の版として保存するページ情報を作成（変更のないページは前回の校正結果を今回のページ番号で引き継ぐ）
+        分析に失敗したページは保存せず、次回は変更のあったページとして再分析する
+        """
+        reusable = self._reusable_corrections(fingerprints, previous_pages)
+        failed_pages = self.failed_pages_of(corrections)
+        pages = {}
+        for page_num, fingerprint in fingerprints.items():
+            if page_num in reusable:
+                page_corrections = reusable[page_num]
+            elif page_num in failed_pages:
+                continue
             else:
-                type_name = correction['type']
-            
-            ws.cell(row=row, column=1, value=correction['page'])
-            ws.cell(row=row, column=2, value=type_name)
-            ws.cell(row=row, column=3, value=correction['content'])
-            ws.cell(row=row, column=4, value=correction['correction'])
-        
-        # 列幅調整
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        wb.save(output_path)
-    
-    def run_image_analysis(self, pdf_path):
-        """画像分析処理の実行"""
+                page_corrections = [c for c in corrections if c['page'] == page_num]
+            pages[page_num] = {'fingerprint': fingerprint, 'corrections': page_corrections}
+        return pages
+    
+    def failed_pages_of(self, corrections):
+        """分析に失敗したページ（失敗した結果を含むページと、分析が完了しなかったページ）"""
+        return self.failed_pages | {c['page'] for c in corrections if c.get('failed')}
+    
+    def export_to_excel(self, output_path):
+        """校正結果をエクセルに出力（output_pathにはファイルオブジェクトも指定可能）"""
+        with self.metrics.stage('excel_export'):
+            write_corrections_excel(self.corrections, output_path)
+    
+    def classify_page(self, document, page_num):
+        """
+        レンダリング前にページを分類し、画像分析が必要かどうかと解像度を返す（戻り値は(分類, DPI)）
+        画像を含むページ・カラーのページは通常の解像度、図形や塗りの多いページは低めの解像度で分析し、
+        テキストのみのページは画像分析を省略する（DPIはNone）
+        """
+        if document.get_images(page_num):
+            return 'figure', Config.RASTER_DPI
+        ink_ratio, color_ratio = document.ink_stats(page_num)
+        if color_ratio >= Config.VISION_COLOR_RATIO:
+            return 'color', Config.RASTER_DPI
+        if document.drawing_count(page_num) >= Config.VISION_MIN_DRAWINGS or ink_ratio >= Config.VISION_INK_RATIO:
+            return 'graphics', Config.VISION_GRAPHICS_DPI
+        return 'text_only', None
+    
+    def render_page(self, document, page_num, dpi=None):
+        """画像分析用にページをレンダリング（戻り値は(画像データ, メディアタイプ)）"""
+        with self.metrics.stage('rasterize') as record:
+            image_data, media_type = document.render_page_image(
+                page_num,
+                dpi=dpi or Config.RASTER_DPI,
+                max_long_edge=Config.RASTER_MAX_LONG_EDGE,
+                image_format=Config.RASTER_FORMAT,
+                quality=Config.RASTER_QUALITY
+            )
+            record['bytes'] = len(image_data)
+        return image_data, media_type
+    
+    def encode_image(self, image_data):
+        """画像データをBedrockに送信するためにbase64エンコード"""
+        with self.metrics.stage('encode') as record:
+            encoded = base64.b64encode(image_data).decode('utf-8')
+            record['bytes'] = len(encoded)
+        return encoded
+    
+    def figure_regions(self, document, page_num):
+        """
+        ページ内の図の切り出し範囲（上端基準の(x0, top, x1, bottom)）を取得
+        画像の範囲に余白を加え、重なる範囲は1つにまとめる
+        """
+        page = document.page_rect(page_num)
+        margin = Config.REGION_MARGIN
+        regions = []
+        for img in document.get_images(page_num):
+            x0, top, x1, bottom = img['bbox']
+            if x1 - x0 < Config.REGION_MIN_SIZE and bottom - top < Config.REGION_MIN_SIZE:
+                continue
+            region = (max(x0 - margin, page.x0), max(top - margin, page.y0),
+                      min(x1 + margin, page.x1), min(bottom + margin, page.y1))
+            if region[2] <= region[0] or region[3] <= region[1]:
+                continue
+            # 重なる範囲を結合（結合後の範囲が他と重なる場合もあるため繰り返す）
+            merged = True
+            while merged:
+                merged = False
+                for other in regions:
+                    if region[0] < other[2] and other[0] < region[2] and region[1] < other[3] and other[1] < region[3]:
+                        regions.remove(other)
+                        region = (min(region[0], other[0]), min(region[1], other[1]),
+                                  max(region[2], other[2]), max(region[3], other[3]))
+                        merged = True
+                        break
+            regions.append(region)
+        
+        # 上限を超える場合は全体を囲む1つの範囲にまとめる
+        if len(regions) > Config.REGION_MAX_CROPS:
+            regions = [(min(r[0] for r in regions), min(r[1] for r in regions),
+                        max(r[2] for r in regions), max(r[3] for r in regions))]
+        return sorted(regions, key=lambda r: (r[1], r[0]))
+    
+    def render_page_regions(self, document, page_num):
+        """
+        ページ全体の低解像度画像と、図の範囲の高解像度画像を作成
+        戻り値は(説明, 画像データ, メディアタイプ)のリスト（図がなければ空）
+        """
+        regions = self.figure_regions(document, page_num)
+        if not regions:
+            return []
+        with self.metrics.stage('rasterize') as record:
+            images = [("ページ全体（縮小）", *document.render_page_image(
+                page_num,
+                dpi=Config.REGION_OVERVIEW_DPI,
+                max_long_edge=Config.RASTER_MAX_LONG_EDGE,
+                image_format=Config.RASTER_FORMAT,
+                quality=Config.RASTER_QUALITY
+            ))]
+            for i, region in enumerate(regions, 1):
+                label = f"図 {i} の拡大（ページ上の位置: x={region[0]:.0f}-{region[2]:.0f}pt, y={region[1]:.0f}-{region[3]:.0f}pt）"
+                images.append((label, *document.render_page_image(
+                    page_num,
+                    dpi=Config.REGION_DPI,
+                    max_long_edge=Config.RASTER_MAX_LONG_EDGE,
+                    image_format=Config.RASTER_FORMAT,
+                    quality=Config.RASTER_QUALITY,
+                    clip=region
+                )))
+            record['bytes'] = sum(len(image_data) for _, image_data, _ in images)
+        return images
+    
+    def run_image_analysis(self, pdf_path, progress_callback=None, pages=None, result_callback=None, delta_callback=None,
+                           page_done_callback=None):
+        """
+        画像分析処理の実行（pdf_pathにはParsedDocumentも指定可能）
+        result_callbackには各ページの分析結果が完了した順に渡される
+        delta_callback(ページ番号, テキスト)には各ページの生成途中のテキストが渡される（バッチモードを除く）
+        page_done_callback(ページ番号)はそのページの分析が完了した（または省略された）時点で呼ばれる
+        """
         try:
-            # PyMuPDFでPDFを開く
-            doc = fitz.open(pdf_path)
+            document, owned = self._as_document(pdf_path)
+            target_pages = list(document.page_numbers if pages is None else pages)
             
-            # 最大ページ数制限
-            max_pages = min(len(doc), Config.MAX_PDF_PAGES)
+            # テキストのみのページは画像分析を省略し、ページごとに解像度を決める
+            page_dpis = {}
+            if Config.VISION_SKIP_TEXT_ONLY:
+                if progress_callback:
+                    progress_callback("画像分析が必要なページを判定中...")
+                for page_num in target_pages:
+                    _, page_dpis[page_num] = self.classify_page(document, page_num)
+                skipped = [page_num for page_num in target_pages if page_dpis[page_num] is None]
+                target_pages = [page_num for page_num in target_pages if page_dpis[page_num] is not None]
+                if progress_callback and skipped:
+                    progress_callback(f"テキストのみのページは画像分析を省略します（{len(skipped)}ページ）")
+                if page_done_callback:
+                    for page_num in skipped:
+                        page_done_callback(page_num)
+            max_pages = len(target_pages)
             
-            corrections = []
-            for page_num in range(max_pages):
-                # PDFページを画像に変換（dpi=200相当）
-                page = doc[page_num]
-                # zoomを2に設定してdpi=200相当にする
-                zoom = 200 / 72  # 72 DPIが基本
-                matrix = fitz.Matrix(zoom, zoom)
-                pix = page.get_pixmap(matrix=matrix)
-                
-                # PyMuPDFのPixmapをPIL Imageに変換
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                
-                # 画像をbase64エンコード
-                img_buffer = io.BytesIO()
-                img.save(img_buffer, format='PNG')
-                img_base64 = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
+            def emit_results(page_numbers, results):
+                group_corrections = []
+                for page_num in page_numbers:
+                    result = self.image_analysis_entry(page_num, results[page_num])
+                    if result_callback:
+                        result_callback(result)
+                    if page_done_callback:
+                        page_done_callback(page_num)
+                    group_corrections.append(result)
+                return group_corrections
+            
+            def page_delta(page_num):
+                if not delta_callback:
+                    return None
+                return lambda delta: delta_callback(page_num, delta)
+            
+            def analyze_group(page_images):
+                if len(page_images) == 1:
+                    page_num, img_base64, media_type = page_images[0]
+                    results = {page_num: self.analyze_image_with_claude(img_base64, page_num, media_type,
+                                                                         page_delta(page_num))}
+                else:
+                    results = self.analyze_images_batch_with_claude(page_images)
+                return emit_results([page_num for page_num, _, _ in page_images], results)
+            
+            def analyze_regions(page_num, region_images):
+                return emit_results([page_num], {page_num: self.analyze_regions_with_claude(page_num, region_images,
+                                                                                            page_delta(page_num))})
+            
+            # 図を含むページは切り出しモードで個別に分析する
+            region_pages = set()
+            if Config.REGION_CROP_ENABLED:
+                region_pages = {page_num for page_num in target_pages if self.figure_regions(document, page_num)}
+            
+            # バッチモードでは複数ページの画像を1回のリクエストにまとめる
+            if Config.BATCH_ENABLED:
+                page_groups = make_batches(target_pages, Config.BATCH_TOKEN_BUDGET, Config.BATCH_MAX_IMAGES,
+                                           lambda page_num: IMAGE_TOKEN_ESTIMATE)
+            else:
+                page_groups = [[page_num] for page_num in target_pages]
+            if region_pages:
+                split_groups = []
+                for group in page_groups:
+                    split_groups.extend([page_num] for page_num in group if page_num in region_pages)
+                    rest = [page_num for page_num in group if page_num not in region_pages]
+                    if rest:
+                        split_groups.append(rest)
+                page_groups = split_groups
+            
+            # ページのレンダリングは順番に行い、AI分析は並列に送信する
+            executor = ThreadPoolExecutor(max_workers=max(1, min(Config.PAGE_CONCURRENCY, len(page_groups))))
+            futures = []
+            try:
+                index = 0
+                for group in page_groups:
+                    if group[0] in region_pages:
+                        page_num = group[0]
+                        index += 1
+                        if progress_callback:
+                            progress_callback(f"ページ {page_num} の図を切り出し中... ({index}/{max_pages})")
+                        region_images = [
+                            (label, self.encode_image(image_data), media_type)
+                            for label, image_data, media_type in self.render_page_regions(document, page_num)
+                        ]
+                        futures.append(executor.submit(analyze_regions, page_num, region_images))
+                        continue
+                    
+                    page_images = []
+                    for page_num in group:
+                        index += 1
+                        if progress_callback:
+                            progress_callback(f"ページ {page_num} を画像に変換中... ({index}/{max_pages})")
+                        
+                        # PDFページを画像に変換（長辺はBedrockの実効解像度まで）
+                        image_data, media_type = self.render_page(document, page_num, page_dpis.get(page_num))
+                        img_base64 = self.encode_image(image_data)
+                        page_images.append((page_num, img_base64, media_type))
+                    
+                    # AI分析
+                    futures.append(executor.submit(analyze_group, page_images))
                 
-                # AI分析
-                analysis_result = self.analyze_image_with_claude(img_base64, page_num + 1)
-                corrections.append({
-                    'type': 'image',
-                    'page': page_num + 1,
-                    'content': f"ページ {page_num + 1} の画像分析",
-                    'correction': analysis_result
-                })
+                corrections = []
+                for future in futures:
+                    corrections.extend(future.result())
+                    if progress_callback:
+                        progress_callback(f"画像分析中... ({len(corrections)}/{max_pages})")
+            finally:
+                executor.shutdown(wait=True)
+                if owned:
+                    document.close()
             
-            doc.close()
             return corrections
             
         except Exception as e:
             print(f"画像分析エラー: {e}")
             return []
     
-    def analyze_image_with_claude(self, image_base64, page_num):
-        """Claude 3.5 Sonnet v2で画像を分析"""
-        try:
-            prompt = f"""
+    def build_image_prompt(self, page_num):
+        """画像分析用のプロンプトを作成"""
+        return f"""
 以下のPDFページ（ページ {page_num}）の画像を校正の観点から分析してください。
 
 特に以下の点を重点的にチェックしてください：
@@ -279,6 +825,11 @@ class PDFCorrector:
 
 日本語で回答してください。
 """
+    
+    def analyze_image_with_claude(self, image_base64, page_num, media_type="image/png", on_delta=None):
+        """Claude 3.5 Sonnet v2で画像を分析（on_deltaには生成途中のテキストが渡される）"""
+        try:
+            prompt = self.build_image_prompt(page_num)
 
             body = json.dumps({
                 "anthropic_version": "bedrock-2023-05-31",
@@ -294,7 +845,7 @@ class PDFCorrector:
                                 "type": "image",
                                 "source": {
                                     "type": "base64",
-                                    "media_type": "image/png",
+                                    "media_type": media_type,
                                     "data": image_base64
                                 }
                             },
@@ -307,21 +858,121 @@ class PDFCorrector:
                 ]
             })
 
-            response = self.bedrock_client.invoke_model(
-                modelId=Config.BEDROCK_MODEL_ID,
-                contentType="application/json",
-                accept="application/json",
-                body=body
-            )
-
-            response_body = json.loads(response['body'].read())
+            response_body = self._invoke_model(body, on_delta, operation="image")
             return response_body['content'][0]['text']
             
         except Exception as e:
             return f"画像分析エラー: {str(e)}"
     
-    def integrate_analysis_results(self, text_corrections, image_corrections):
-        """AIでテキスト分析と画像分析の結果を統合"""
+    def analyze_regions_with_claude(self, page_num, region_images, on_delta=None):
+        """
+        ページ全体の縮小画像と図の拡大画像をまとめて分析
+        region_imagesは(説明, base64画像, メディアタイプ)のリスト（先頭がページ全体）
+        """
+        try:
+            content = []
+            for label, image_base64, media_type in region_images:
+                content.append({"type": "text", "text": f"=== {label} ==="})
+                content.append({
+                    "type": "image",
+                    "source": {
+                        "type": "base64",
+                        "media_type": media_type,
+                        "data": image_base64
+                    }
+                })
+            content.append({
+                "type": "text",
+                "text": "1枚目はページ全体の縮小画像、2枚目以降はページ内の図を高解像度で切り出した画像です。"
+                        "レイアウトはページ全体の画像で、図の細部は拡大画像で確認してください。\n"
+                        + self.build_image_prompt(page_num)
+            })
+            
+            body = json.dumps({
+                "anthropic_version": "bedrock-2023-05-31",
+                "max_tokens": 2500,
+                "temperature": Config.TEMPERATURE,
+                "top_p": Config.TOP_P,
+                "top_k": Config.TOP_K,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": content
+                    }
+                ]
+            })
+            
+            response_body = self._invoke_model(body, on_delta, operation="image_regions")
+            return response_body['content'][0]['text']
+            
+        except Exception as e:
+            return f"画像分析エラー: {str(e)}"
+    
+    def analyze_images_batch_with_claude(self, page_images):
+        """
+        複数ページの画像を1回のリクエストで分析し、ページ番号ごとの結果を返す
+        page_imagesは(ページ番号, base64画像, メディアタイプ)のリスト
+        応答を解析できなかったページは個別に分析し直す
+        """
+        page_numbers = [page_num for page_num, _, _ in page_images]
+        content = []
+        for page_num, image_base64, media_type in page_images:
+            content.append({"type": "text", "text": f"=== ページ {page_num} ==="})
+            content.append({
+                "type": "image",
+                "source": {
+                    "type": "base64",
+                    "media_type": media_type,
+                    "data": image_base64
+                }
+            })
+        content.append({"type": "text", "text": f"""
+上記の各PDFページ（ページ {', '.join(str(p) for p in page_numbers)}）の画像をページごとに校正の観点から分析してください。
+
+特に以下の点を重点的にチェックしてください：
+- 不要な線、マーク、編集痕跡
+- レイアウトの問題
+- 視覚的な不整合
+- 画像の配置ミス
+- フォントの不統一
+- 余白の不適切な使用
+
+各ページの分析結果を、ページ番号をキーにした次のJSON形式のみで回答してください（JSON以外の文章は不要です）:
+{{"pages": {{"{page_numbers[0]}": "- 視覚的問題: ...\\n- 修正提案: ...\\n- その他: ...", ...}}}}
+
+日本語で回答してください。
+"""})
+        try:
+            body = json.dumps({
+                "anthropic_version": "bedrock-2023-05-31",
+                "max_tokens": min(2500 * len(page_images), Config.BATCH_MAX_OUTPUT_TOKENS),
+                "temperature": Config.TEMPERATURE,
+                "top_p": Config.TOP_P,
+                "top_k": Config.TOP_K,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": content
+                    }
+                ]
+            })
+            
+            response_body = self._invoke_model(body, operation="image_batch")
+            results = parse_batch_response(response_body['content'][0]['text'], page_numbers)
+        except Exception as e:
+            print(f"バッチ画像分析エラー: {e}")
+            results = {}
+        
+        for page_num, image_base64, media_type in page_images:
+            if page_num not in results:
+                results[page_num] = self.analyze_image_with_claude(image_base64, page_num, media_type)
+        return results
+    
+    def integrate_analysis_results(self, text_corrections, image_corrections, result_callback=None, delta_callback=None):
+        """
+        AIでテキスト分析と画像分析の結果を統合（result_callbackには各ページの統合結果が渡される）
+        delta_callback(ページ番号, テキスト)には各ページの生成途中のテキストが渡される
+        """
         try:
             # ページごとにグループ化
             page_groups = {}
@@ -340,28 +991,35 @@ class PDFCorrector:
                     page_groups[page] = {'text': [], 'image': []}
                 page_groups[page]['image'].append(correction)
             
-            # 各ページの結果をAIで統合
-            integrated_results = []
-            for page_num in sorted(page_groups.keys()):
-                if page_num == 0:  # 情報項目はスキップ
-                    continue
-                    
-                text_results = page_groups[page_num]['text']
-                image_results = page_groups[page_num]['image']
-                
-                # AIで統合
-                integrated_result = self.integrate_page_results_with_ai(page_num, text_results, image_results)
-                integrated_results.append(integrated_result)
+            # 各ページの結果をAIで並列に統合（情報項目のページ0はスキップ、結果はページ順）
+            def integrate_page(page_num):
+                on_delta = None
+                if delta_callback:
+                    on_delta = lambda delta: delta_callback(page_num, delta)
+                integrated_result = self._integrate_page(
+                    page_num, page_groups[page_num]['text'], page_groups[page_num]['image'], on_delta)
+                if result_callback:
+                    result_callback(integrated_result)
+                return integrated_result
             
-            return integrated_results
+            page_numbers = [page_num for page_num in sorted(page_groups.keys()) if page_num != 0]
+            return map_in_order(integrate_page, page_numbers, Config.PAGE_CONCURRENCY)
             
         except Exception as e:
             # エラーの場合は元の結果をそのまま返す
             print(f"統合処理エラー: {e}")
             return text_corrections + image_corrections
     
-    def integrate_page_results_with_ai(self, page_num, text_results, image_results):
-        """AIでページのテキスト分析と画像分析結果を統合"""
+    def _integrate_page(self, page_num, text_results, image_results, on_delta=None):
+        """ページの統合（処理時間を計測、分析に失敗した結果を含む場合は統合結果にも'failed'を付ける）"""
+        with self.metrics.stage('integrate'):
+            integrated = self.integrate_page_results_with_ai(page_num, text_results, image_results, on_delta)
+        if any(result.get('failed') for result in text_results + image_results):
+            integrated['failed'] = True
+        return integrated
+    
+    def integrate_page_results_with_ai(self, page_num, text_results, image_results, on_delta=None):
+        """AIでページのテキスト分析と画像分析結果を統合（on_deltaには生成途中のテキストが渡される）"""
         try:
             # テキスト分析結果をまとめる
             text_summary = ""
@@ -414,14 +1072,7 @@ class PDFCorrector:
                 ]
             })
 
-            response = self.bedrock_client.invoke_model(
-                modelId=Config.BEDROCK_MODEL_ID,
-                contentType="application/json",
-                accept="application/json",
-                body=body
-            )
-
-            response_body = json.loads(response['body'].read())
+            response_body = self._invoke_model(body, on_delta, operation="integrate")
             integrated_correction = response_body['content'][0]['text']
             
             return {
@@ -437,5 +1088,181 @@ class PDFCorrector:
                 'type': 'integrated',
                 'page': page_num,
                 'content': f"ページ {page_num} の校正結果（エラーにより統合失敗）",
-                'correction': f"統合処理中にエラーが発生しました: {str(e)}\n\nテキスト分析結果:\n{text_summary}\n\n画像分析結果:\n{image_summary}"
+                'correction': f"統合処理中にエラーが発生しました: {str(e)}\n\nテキスト分析結果:\n{text_summary}\n\n画像分析結果:\n{image_summary}",
+                'failed': True
             }
+    
+    def extract_only(self, pdf_path, pages=None):
+        """AIを使わずにテキスト抽出とルールチェックのみを行う（AI機能が無効な場合の高速処理）"""
+        corrections = []
+        for item in self.extract_text_from_pdf(pdf_path, pages):
+            corrections.append(self.text_entry(item, 'AI機能が無効のため校正は実行されていません'))
+            if Config.RULE_CHECK_ENABLED:
+                rule_entry = self.check_with_rules(item)
+                if rule_entry:
+                    corrections.append(rule_entry)
+        return corrections
+    
+    def run_pipeline(self, pdf_path, progress_callback=None, result_callback=None,
+                     revision_store=None, document_key=None, use_ai=True, delta_callback=None):
+        """
+        テキスト分析・画像分析・統合を各1回ずつ実行し、統合した校正結果を返す（Web版・GUI版共通）
+        result_callback(stage, correction)にはstage='text'/'image'/'integrated'の結果が完了順に渡される
+        delta_callback(stage, page, text)には各段階の生成途中のテキストが渡される
+        revision_storeとdocument_keyを指定すると、前回の版から変更のないページは前回の結果を再利用する
+        """
+        pipeline_start = time.perf_counter()
+        self.failed_pages = set()
+        
+        def stage_callback(stage):
+            if not result_callback:
+                return None
+            return lambda correction: result_callback(stage, correction)
+        
+        def stage_delta_callback(stage):
+            if not delta_callback:
+                return None
+            return lambda page_num, delta: delta_callback(stage, page_num, delta)
+        
+        # PDFは一度だけ開き、全ての処理で共有する
+        with self.open_document(pdf_path) as document:
+            if not use_ai:
+                if progress_callback:
+                    progress_callback("テキストを抽出中...")
+                self.corrections = self.extract_only(document)
+                return self.corrections
+            
+            # 前回の版と比較し、変更のあったページのみ再分析する
+            fingerprints = {}
+            previous_pages = {}
+            changed_pages = None
+            reused_corrections = []
+            if revision_store and document_key:
+                fingerprints = self.fingerprint_pages(document)
+                previous_pages = revision_store.load(document_key)
+                changed_pages, reused_corrections = self.find_changed_pages(fingerprints, previous_pages)
+                if progress_callback and reused_corrections:
+                    progress_callback(f"変更のあったページのみ分析します（{len(changed_pages)}/{len(fingerprints)}ページ）")
+                for correction in reused_corrections:
+                    if result_callback:
+                        result_callback('integrated', correction)
+            
+            target_pages = list(document.page_numbers) if changed_pages is None else changed_pages
+            
+            # 長い文書はページ範囲ごとに抽出・分析・統合を行い、完了した範囲をチェックポイントに保存する
+            checkpoint = None
+            corrections = []
+            if len(target_pages) > Config.PAGE_WINDOW_SIZE:
+                checkpoint = PipelineCheckpoint(Config.CHECKPOINT_FOLDER, document_checkpoint_key(
+                    document.pdf_path, Config.BEDROCK_MODEL_ID, Config.PROMPT_TEMPLATE_VERSION))
+                completed = checkpoint.load()
+                resumed_pages = [page_num for page_num in target_pages if page_num in completed]
+                if resumed_pages:
+                    if progress_callback:
+                        progress_callback(f"前回中断した処理を再開します（{len(resumed_pages)}ページ完了済み）")
+                    for page_num in resumed_pages:
+                        for correction in completed[page_num]:
+                            corrections.append(correction)
+                            if result_callback:
+                                result_callback('integrated', correction)
+                target_pages = [page_num for page_num in target_pages if page_num not in completed]
+            
+            windows = [target_pages[i:i + Config.PAGE_WINDOW_SIZE]
+                       for i in range(0, len(target_pages), Config.PAGE_WINDOW_SIZE)]
+            for window_index, window in enumerate(windows, 1):
+                if progress_callback and len(windows) > 1:
+                    progress_callback(f"ページ {window[0]}〜{window[-1]} を処理中... ({window_index}/{len(windows)})")
+                
+                window_corrections = self._run_window(document, window, progress_callback, stage_callback,
+                                                      stage_delta_callback)
+                corrections.extend(window_corrections)
+                if checkpoint:
+                    # 分析に失敗したページは再開時に再分析する
+                    failed_pages = self.failed_pages_of(window_corrections)
+                    checkpoint.append([c for c in window_corrections if c['page'] not in failed_pages])
+                
+                # 処理済みページのキャッシュを解放してメモリ使用量を一定に保つ
+                document.release_pages(window)
+        
+        # 今回の版のページ情報を保存し、変更のないページの結果を合わせる
+        if revision_store and document_key:
+            revision_store.save(document_key, self.build_revision_pages(fingerprints, corrections, previous_pages))
+        self.corrections = sorted(corrections + reused_corrections, key=lambda c: c['page'])
+        if checkpoint:
+            checkpoint.remove()
+        self.metrics.record_stage('pipeline', time.perf_counter() - pipeline_start)
+        
+        if progress_callback:
+            progress_callback("校正完了！")
+        
+        return self.corrections
+    
+    def _run_window(self, document, pages, progress_callback, stage_callback, stage_delta_callback):
+        """
+        ページ範囲のテキスト分析と画像分析を並列実行し、統合結果を返す
+        各ページはテキスト分析と画像分析の両方が完了した時点で統合を開始し、統合も並列に実行する
+        """
+        lock = threading.Lock()
+        page_results = {page_num: {'text': [], 'image': []} for page_num in pages}
+        done_stages = {page_num: set() for page_num in pages}
+        integration_futures = {}
+        integrated_callback = stage_callback('integrated')
+        integrated_delta_callback = stage_delta_callback('integrated')
+        
+        def collect(stage):
+            callback = stage_callback(stage)
+            
+            def on_result(correction):
+                with lock:
+                    page_results[correction['page']][stage].append(correction)
+                if callback:
+                    callback(correction)
+            return on_result
+        
+        def integrate(page_num):
+            if progress_callback:
+                progress_callback(f"ページ {page_num} の結果をAIで統合中...")
+            on_delta = None
+            if integrated_delta_callback:
+                on_delta = lambda delta: integrated_delta_callback(page_num, delta)
+            integrated = self._integrate_page(
+                page_num, page_results[page_num]['text'], page_results[page_num]['image'], on_delta)
+            if integrated_callback:
+                integrated_callback(integrated)
+            return integrated
+        
+        def schedule(page_num):
+            """ページの統合を開始（呼び出し側でlockを取得すること、結果のないページは統合しない）"""
+            if page_num in integration_futures:
+                return
+            results = page_results[page_num]
+            integration_futures[page_num] = None
+            if results['text'] or results['image']:
+                integration_futures[page_num] = integration_executor.submit(integrate, page_num)
+        
+        def page_done(stage):
+            def on_done(page_num):
+                with lock:
+                    done_stages[page_num].add(stage)
+                    if len(done_stages[page_num]) == 2:
+                        schedule(page_num)
+            return on_done
+        
+        with ThreadPoolExecutor(max_workers=max(1, Config.PAGE_CONCURRENCY)) as integration_executor:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                text_future = executor.submit(self.process_pdf, document, progress_callback, pages,
+                                              collect('text'), stage_delta_callback('text'), page_done('text'))
+                image_future = executor.submit(self.run_image_analysis, document, progress_callback, pages,
+                                               collect('image'), stage_delta_callback('image'), page_done('image'))
+                text_future.result()
+                image_future.result()
+            
+            # 完了が通知されなかったページ（画像分析のエラー時など）はここで統合し、失敗したページとして記録する
+            with lock:
+                for page_num in pages:
+                    if len(done_stages[page_num]) < 2:
+                        self.failed_pages.add(page_num)
+                    schedule(page_num)
+            
+            return [integration_futures[page_num].result() for page_num in sorted(integration_futures)
+                    if integration_futures[page_num] is not None]
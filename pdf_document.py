@@ -0,0 +1,160 @@
+"""
+PDF文書モデル
+PDFを一度だけ開いて解析し、テキスト抽出・画像位置の取得・ページのレンダリングで共有する
+"""
+import hashlib
+import threading
+import io
+import fitz  # PyMuPDF
+from PIL import Image, ImageDraw
+
+# 出力形式ごとのメディアタイプ
+IMAGE_MEDIA_TYPES = {
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'webp': 'image/webp'
+}
+
+
+class ParsedDocument:
+    """
+    一度だけ開いたPDFをページ単位で遅延参照するための文書オブジェクト
+    ページ番号は1始まり（校正結果の'page'と同じ）
+    """
+    def __init__(self, pdf_path, max_pages=None):
+        self.pdf_path = pdf_path
+        self.doc = fitz.open(pdf_path)
+        self.total_pages = len(self.doc)
+        self.page_count = self.total_pages if max_pages is None else min(self.total_pages, max_pages)
+        # PyMuPDFの文書オブジェクトはスレッドセーフではないため、アクセスを直列化する
+        self.lock = threading.RLock()
+        self._texts = {}
+        self._images = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self.lock:
+            if not self.doc.is_closed:
+                self.doc.close()
+
+    @property
+    def page_numbers(self):
+        return range(1, self.page_count + 1)
+
+    def get_text(self, page_num):
+        """ページのテキストを取得（初回のみ抽出）"""
+        with self.lock:
+            if page_num not in self._texts:
+                page = self.doc[page_num - 1]
+                self._texts[page_num] = page.get_text("text", sort=True).strip()
+            return self._texts[page_num]
+
+    def get_images(self, page_num):
+        """
+        ページ内の画像の位置情報を取得（初回のみ抽出）
+        座標はpdfplumberと同じ形式（bboxは上端基準、y0/y1は下端基準）
+        """
+        with self.lock:
+            if page_num not in self._images:
+                page = self.doc[page_num - 1]
+                height = page.rect.height
+                images = []
+                for info in page.get_image_info():
+                    x0, top, x1, bottom = info['bbox']
+                    images.append({
+                        'page': page_num,
+                        'bbox': (x0, top, x1, bottom),
+                        'x0': x0,
+                        'y0': height - bottom,
+                        'x1': x1,
+                        'y1': height - top
+                    })
+                self._images[page_num] = images
+            return self._images[page_num]
+
+    def drawing_count(self, page_num):
+        """ページ内のベクター描画（線・図形）の数を取得"""
+        with self.lock:
+            page = self.doc[page_num - 1]
+            return len(page.get_cdrawings())
+
+    def ink_stats(self, page_num, dpi=24):
+        """
+        低解像度でレンダリングしたページの (インク率, 有彩色率) を取得
+        インク率はテキストブロック以外の範囲にある白以外の画素の割合、有彩色率は彩度の高い画素の割合
+        （低解像度では本文の文字も灰色の画素になるため、テキストブロックの範囲は白で塗りつぶしてから数える）
+        """
+        zoom = dpi / 72
+        matrix = fitz.Matrix(zoom, zoom)
+        with self.lock:
+            page = self.doc[page_num - 1]
+            pix = page.get_pixmap(matrix=matrix, alpha=False)
+            text_rects = [fitz.Rect(block[:4]) * matrix for block in page.get_text("blocks") if block[6] == 0]
+        img = Image.frombuffer("RGB", (pix.width, pix.height), pix.samples_mv, "raw", "RGB", pix.stride, 1)
+        total = pix.width * pix.height
+        saturation_histogram = img.convert('HSV').getchannel('S').histogram()
+        gray = img.convert('L')
+        draw = ImageDraw.Draw(gray)
+        for rect in text_rects:
+            draw.rectangle((rect.x0, rect.y0, rect.x1, rect.y1), fill=255)
+        gray_histogram = gray.histogram()
+        ink_ratio = sum(gray_histogram[:200]) / total
+        color_ratio = sum(saturation_histogram[64:]) / total
+        return ink_ratio, color_ratio
+
+    def release_pages(self, page_numbers):
+        """処理済みページの抽出結果のキャッシュを解放"""
+        with self.lock:
+            for page_num in page_numbers:
+                self._texts.pop(page_num, None)
+                self._images.pop(page_num, None)
+
+    def page_rect(self, page_num):
+        """ページの大きさ（ポイント単位、上端基準）を取得"""
+        with self.lock:
+            return fitz.Rect(self.doc[page_num - 1].rect)
+
+    def render_page_image(self, page_num, dpi=200, max_long_edge=None, image_format='jpeg', quality=85, clip=None):
+        """
+        ページをレンダリングしてエンコード済みの画像を返す（戻り値は(画像データ, メディアタイプ)）
+        max_long_edgeを指定すると長辺がそのピクセル数以下になるよう解像度を下げる
+        clip（上端基準の(x0, top, x1, bottom)）を指定するとその範囲のみをレンダリングする
+        JPEG/PNGはPixmapから直接エンコードし、WebPのみPillowを経由する
+        """
+        zoom = dpi / 72  # 72 DPIが基本
+        with self.lock:
+            page = self.doc[page_num - 1]
+            rect = page.rect if clip is None else fitz.Rect(clip) & page.rect
+            if max_long_edge:
+                long_edge = max(rect.width, rect.height)
+                zoom = min(zoom, max_long_edge / long_edge)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False, clip=None if clip is None else rect)
+
+        if image_format == 'jpeg':
+            data = pix.tobytes('jpeg', jpg_quality=quality)
+        elif image_format == 'webp':
+            img = Image.frombuffer("RGB", (pix.width, pix.height), pix.samples_mv, "raw", "RGB", pix.stride, 1)
+            buffer = io.BytesIO()
+            img.save(buffer, format='WEBP', quality=quality)
+            data = buffer.getvalue()
+        else:
+            data = pix.tobytes('png')
+        return data, IMAGE_MEDIA_TYPES.get(image_format, 'image/png')
+
+    def page_fingerprint(self, page_num, dpi=36):
+        """
+        ページの指紋を取得（差分校正用）
+        抽出テキストのハッシュと、低解像度グレースケール画像のハッシュの組
+        """
+        text_hash = hashlib.sha256(self.get_text(page_num).encode('utf-8')).hexdigest()
+        zoom = dpi / 72
+        with self.lock:
+            page = self.doc[page_num - 1]
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY)
+            raster_hash = hashlib.sha256(pix.samples).hexdigest()
+        return {'text': text_hash, 'raster': raster_hash}
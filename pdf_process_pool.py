@@ -0,0 +1,112 @@
+"""
+PDF処理のプロセスプールモジュール
+テキスト抽出・ページのレンダリングなどCPU負荷の高い処理を別プロセスで実行し、
+Webサーバーのスレッド（Bedrockの呼び出し待ち）がGILで待たされないようにする
+
+ワーカーは起動時にPyMuPDFを読み込んでおき、開いたPDFをプロセス内で再利用する（ページの抽出結果は保持しない）
+結果はテキスト・エンコード済みの画像データなど小さなデータのみを返す
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from pdf_document import ParsedDocument
+
+# ワーカープロセス内で開いているPDF（(パス, 更新時刻) → ParsedDocument）
+_worker_documents = OrderedDict()
+_WORKER_MAX_DOCUMENTS = 4
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _warm_up():
+    """ワーカーの起動を待つための空の処理"""
+    return os.getpid()
+
+
+def _open_worker_document(pdf_path):
+    """ワーカー内でPDFを開く（削除されたファイルのPDFは閉じ、古いものから閉じる）"""
+    for key in [key for key in _worker_documents if not os.path.exists(key[0])]:
+        _worker_documents.pop(key).close()
+
+    key = (pdf_path, os.path.getmtime(pdf_path))
+    if key in _worker_documents:
+        _worker_documents.move_to_end(key)
+        return _worker_documents[key]
+
+    document = ParsedDocument(pdf_path)
+    _worker_documents[key] = document
+    while len(_worker_documents) > _WORKER_MAX_DOCUMENTS:
+        _worker_documents.popitem(last=False)[1].close()
+    return document
+
+
+def _call_document(pdf_path, method, args, kwargs):
+    """
+    ワーカー内でParsedDocumentのメソッドを実行（第1引数はページ番号）
+    抽出結果は親プロセス側でキャッシュし、release_pagesで解放するため、ワーカー内には残さない
+    """
+    document = _open_worker_document(pdf_path)
+    try:
+        return getattr(document, method)(*args, **kwargs)
+    finally:
+        document.release_pages([args[0]])
+
+
+def get_process_pool(max_workers):
+    """共有のプロセスプールを取得（初回のみ作成し、全ワーカーを起動しておく）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # スレッドを持つ親プロセスからforkすると不安定になるためspawnで起動する
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+            for future in [_pool.submit(_warm_up) for _ in range(max_workers)]:
+                future.result()
+        return _pool
+
+
+class ProcessPoolDocument(ParsedDocument):
+    """
+    テキスト抽出・レンダリングをプロセスプールで実行する文書オブジェクト
+    ページ数などの軽い情報は親プロセスで開いたPDFから取得する
+    """
+    def __init__(self, pdf_path, max_pages=None, max_workers=None):
+        super().__init__(pdf_path, max_pages)
+        self.pool = get_process_pool(max_workers or os.cpu_count() or 1)
+
+    def _remote(self, method, *args, **kwargs):
+        return self.pool.submit(_call_document, os.path.abspath(self.pdf_path), method, args, kwargs).result()
+
+    def get_text(self, page_num):
+        with self.lock:
+            if page_num in self._texts:
+                return self._texts[page_num]
+        text = self._remote('get_text', page_num)
+        with self.lock:
+            self._texts[page_num] = text
+        return text
+
+    def get_images(self, page_num):
+        with self.lock:
+            if page_num in self._images:
+                return self._images[page_num]
+        images = self._remote('get_images', page_num)
+        with self.lock:
+            self._images[page_num] = images
+        return images
+
+    def drawing_count(self, page_num):
+        return self._remote('drawing_count', page_num)
+
+    def ink_stats(self, page_num, dpi=24):
+        return self._remote('ink_stats', page_num, dpi)
+
+    def render_page_image(self, page_num, dpi=200, max_long_edge=None, image_format='jpeg', quality=85, clip=None):
+        if clip is not None:
+            clip = tuple(clip)
+        return self._remote('render_page_image', page_num, dpi, max_long_edge, image_format, quality, clip)
+
+    def page_fingerprint(self, page_num, dpi=36):
+        return self._remote('page_fingerprint', page_num, dpi)
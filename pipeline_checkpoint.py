@@ -0,0 +1,53 @@
+"""
+長文書処理のチェックポイントモジュール
+ページ範囲ごとの統合結果を追記保存し、処理が途中で失敗した場合は完了済みのページから再開する
+"""
+import os
+import json
+import hashlib
+
+
+def document_checkpoint_key(pdf_path, model_id, prompt_version):
+    """PDFの内容・モデル・プロンプトのバージョンからチェックポイントのキーを生成"""
+    digest = hashlib.sha256()
+    digest.update(f"{prompt_version}\n{model_id}\n".encode('utf-8'))
+    with open(pdf_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PipelineCheckpoint:
+    def __init__(self, folder, key):
+        self.path = os.path.join(folder, f"{key}.jsonl")
+        os.makedirs(folder, exist_ok=True)
+
+    def load(self):
+        """完了済みの結果をページ番号ごとに取得"""
+        completed = {}
+        if not os.path.exists(self.path):
+            return completed
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    # 書き込み途中で中断した行は無視する
+                    if not line.endswith('\n'):
+                        break
+                    correction = json.loads(line)
+                    completed.setdefault(correction['page'], []).append(correction)
+        except (OSError, ValueError) as e:
+            print(f"チェックポイント読み込みエラー: {e}")
+        return completed
+
+    def append(self, corrections):
+        """ページ範囲の結果を追記"""
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for correction in corrections:
+                f.write(json.dumps(correction, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def remove(self):
+        """全ページの処理が完了したらチェックポイントを削除"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,154 @@
+"""
+処理時間の計測モジュール
+PDFを開く・テキスト抽出・レンダリング・エンコード・Bedrock呼び出し・統合・エクセル出力の各段階について
+処理時間・データサイズ・トークン数を記録する
+
+記録した値はプロセス全体の集計（/metricsでPrometheus形式で出力）と、
+1回の校正処理ごとの内訳（ジョブ結果のJSONに含める）の両方に加算する
+集計はプロセスごとのため、gunicornの複数ワーカーではワーカーごとの値になる
+"""
+import time
+import threading
+from contextlib import contextmanager
+
+# Bedrock呼び出しの所要時間のヒストグラムの区切り（秒）
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# メトリクス名 → (種類, 説明)
+METRIC_DEFINITIONS = {
+    'pdf_corrector_stage_seconds_total': ('counter', '段階ごとの処理時間の合計（秒）'),
+    'pdf_corrector_stage_calls_total': ('counter', '段階ごとの実行回数'),
+    'pdf_corrector_stage_bytes_total': ('counter', '段階ごとに生成したデータのサイズの合計（バイト）'),
+    'pdf_corrector_bedrock_requests_total': ('counter', 'Bedrockの呼び出し回数'),
+    'pdf_corrector_bedrock_errors_total': ('counter', 'Bedrockの呼び出しエラー数'),
+    'pdf_corrector_bedrock_cache_hits_total': ('counter', 'キャッシュから返したBedrockの結果の数'),
+    'pdf_corrector_bedrock_request_bytes_total': ('counter', 'Bedrockへのリクエストのサイズの合計（バイト）'),
+    'pdf_corrector_bedrock_tokens_total': ('counter', 'Bedrockの入力・出力トークン数の合計'),
+    'pdf_corrector_bedrock_request_seconds': ('histogram', 'Bedrockの呼び出しの所要時間（秒、待機と再試行を含む）'),
+}
+
+
+def _format_labels(labels):
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}' if labels else ''
+
+
+class MetricsRegistry:
+    """プロセス全体のカウンターとヒストグラム"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, labels=(), value=1):
+        with self.lock:
+            key = (name, tuple(labels))
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            key = (name, tuple(labels))
+            histogram = self.histograms.setdefault(key, {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0})
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def render(self):
+        """Prometheusのテキスト形式で出力"""
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: dict(value, buckets=list(value['buckets'])) for key, value in self.histograms.items()}
+
+        lines = []
+        for name, (metric_type, description) in METRIC_DEFINITIONS.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            if metric_type == 'counter':
+                for (metric_name, labels), value in sorted(counters.items()):
+                    if metric_name == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+            else:
+                for (metric_name, labels), histogram in sorted(histograms.items()):
+                    if metric_name != name:
+                        continue
+                    for bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class JobMetrics:
+    """
+    1回の校正処理の計測結果（PDFCorrectorのインスタンスごと）
+    各段階の時間は並列に実行された処理の合計のため、全体の経過時間を超えることがある
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.bedrock = {}
+
+    @contextmanager
+    def stage(self, name):
+        """段階の処理時間を計測（戻り値の辞書の'bytes'に生成したデータのサイズを設定できる）"""
+        record = {'bytes': 0}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self.record_stage(name, time.perf_counter() - start, record['bytes'])
+
+    def record_stage(self, name, seconds, payload_bytes=0):
+        labels = (('stage', name),)
+        registry.inc('pdf_corrector_stage_seconds_total', labels, seconds)
+        registry.inc('pdf_corrector_stage_calls_total', labels)
+        if payload_bytes:
+            registry.inc('pdf_corrector_stage_bytes_total', labels, payload_bytes)
+        with self.lock:
+            stage = self.stages.setdefault(name, {'count': 0, 'seconds': 0.0, 'bytes': 0})
+            stage['count'] += 1
+            stage['seconds'] += seconds
+            stage['bytes'] += payload_bytes
+
+    def record_model_call(self, operation, seconds, request_bytes, usage=None, cached=False, error=False):
+        """Bedrockの呼び出し1回分を記録（usageはレスポンスボディの'usage'）"""
+        labels = (('operation', operation),)
+        usage = usage or {}
+        input_tokens = usage.get('input_tokens', 0) if not cached else 0
+        output_tokens = usage.get('output_tokens', 0) if not cached else 0
+        if cached:
+            registry.inc('pdf_corrector_bedrock_cache_hits_total', labels)
+        else:
+            registry.inc('pdf_corrector_bedrock_requests_total', labels)
+            registry.inc('pdf_corrector_bedrock_request_bytes_total', labels, request_bytes)
+            registry.observe('pdf_corrector_bedrock_request_seconds', labels, seconds)
+            if error:
+                registry.inc('pdf_corrector_bedrock_errors_total', labels)
+            registry.inc('pdf_corrector_bedrock_tokens_total', labels + (('direction', 'input'),), input_tokens)
+            registry.inc('pdf_corrector_bedrock_tokens_total', labels + (('direction', 'output'),), output_tokens)
+        with self.lock:
+            stats = self.bedrock.setdefault(operation, {
+                'requests': 0, 'cache_hits': 0, 'errors': 0, 'seconds': 0.0,
+                'request_bytes': 0, 'input_tokens': 0, 'output_tokens': 0
+            })
+            if cached:
+                stats['cache_hits'] += 1
+                return
+            stats['requests'] += 1
+            stats['errors'] += 1 if error else 0
+            stats['seconds'] += seconds
+            stats['request_bytes'] += request_bytes
+            stats['input_tokens'] += input_tokens
+            stats['output_tokens'] += output_tokens
+
+    def summary(self):
+        """ジョブ結果に含める内訳（秒数は小数第3位まで）"""
+        with self.lock:
+            stages = {name: dict(stage, seconds=round(stage['seconds'], 3)) for name, stage in self.stages.items()}
+            bedrock = {name: dict(stats, seconds=round(stats['seconds'], 3)) for name, stats in self.bedrock.items()}
+        return {'stages': stages, 'bedrock': bedrock}
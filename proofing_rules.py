@@ -0,0 +1,156 @@
+"""
+ルールベース校正モジュール
+AIを呼び出す前に、表記ゆれ・全角/半角・重複語・数値の書式などを辞書と正規表現で検出し、
+ページにAIによる校正が必要かどうかを判定する
+数値の書式の判定例はcheck_numbersのdoctestを参照（python -m doctest proofing_rules.py で確認できる）
+"""
+import re
+
+# 送り仮名（公用文の表記に合わせる）
+OKURIGANA_RULES = {
+    '行なう': '行う',
+    '行なわ': '行わ',
+    '行ない': '行い',
+    '行なっ': '行っ',
+    '表わす': '表す',
+    '表わさ': '表さ',
+    '表わし': '表し',
+    '現われ': '現れ',
+    '少くない': '少なくない',
+    '断わる': '断る',
+    '断わり': '断り',
+}
+
+# 同じページ内で混在させない表記のグループ
+# 公用文では名詞の「受付」「申込」「取扱」「引渡」と動詞の「受け付け」などを使い分けるため、送り仮名を省いた名詞形は含めない
+NOTATION_VARIANTS = [
+    ('問い合わせ', '問合せ', '問い合せ'),
+    ('申し込み', '申込み'),
+    ('取り扱い', '取扱い'),
+    ('打ち合わせ', '打合せ', '打ち合せ'),
+    ('受け付け', '受付け'),
+    ('引き渡し', '引渡し'),
+    ('お客様', 'お客さま'),
+    ('下さい', 'ください'),
+    ('出来る', 'できる'),
+    ('及び', 'および'),
+    ('又は', 'または'),
+]
+
+FULLWIDTH_ALNUM_PATTERN = re.compile(r'[Ａ-Ｚａ-ｚ０-９]+')
+HALFWIDTH_KANA_PATTERN = re.compile(r'[ｦ-ﾟ]+')
+REPEATED_PARTICLE_PATTERN = re.compile(r'(を|が|に|へ|、|。)\1+')
+DUPLICATE_ASCII_WORD_PATTERN = re.compile(r'\b([A-Za-z]+)\s+\1\b', re.IGNORECASE)
+DUPLICATE_JAPANESE_WORD_PATTERN = re.compile(r'([一-龯ァ-ヶー]{2,})\1')
+# カンマで区切られた数字の並び（桁区切り・列挙のどちらか）
+COMMA_NUMBER_PATTERN = re.compile(r'(?<![\d.])\d+(?:,\d+)+(?![\d.])')
+GROUPED_NUMBER_PATTERN = re.compile(r'(?<![\d,.\-])\d{1,3}(?:,\d{3})+(?![\d,])')
+# 日付・時刻・番号の一部（2024/10/17、12:30、2024年、1.5、03-1234など）と
+# 英字に続く型番（ABC2000、A4000）は桁区切りの対象外
+UNGROUPED_NUMBER_PATTERN = re.compile(r'(?<![\d,.\-/:／．：A-Za-zＡ-Ｚａ-ｚ])\d{4,}(?![\d,.\-/:／．：年月日時分A-Za-zＡ-Ｚａ-ｚ])')
+# 規格番号（ISO 9001、JIS Z 8301、IEC 60950など）は桁区切りの対象外
+STANDARD_NUMBER_PATTERN = re.compile(r'(?<![A-Za-z])(?:ISO|IEC|JIS|EN|IEEE|ANSI|RFC|DIN)(?:[ 　/\-]?(?:IEC|[A-Z]))?[ 　\-]?\d+')
+UNIT_WITH_SPACE_PATTERN = re.compile(r'\d[ 　]+(?:kg|mg|g|km|cm|mm|m|mL|ml|L|%)(?![A-Za-z])')
+UNIT_WITHOUT_SPACE_PATTERN = re.compile(r'\d(?:kg|mg|g|km|cm|mm|m|mL|ml|L|%)(?![A-Za-z])')
+LETTER_PATTERN = re.compile(r'[A-Za-zぁ-んァ-ヶ一-龯]')
+
+
+def _fullwidth_to_halfwidth(text):
+    return ''.join(chr(ord(c) - 0xFEE0) for c in text)
+
+
+def _count_variants(text, variants):
+    """長い表記から順に数え、短い表記が長い表記の一部として重複して数えられないようにする"""
+    counts = {}
+    for variant in sorted(variants, key=len, reverse=True):
+        counts[variant] = text.count(variant)
+        text = text.replace(variant, '\0')
+    return counts
+
+
+def _is_invalid_grouping(number):
+    """
+    カンマ区切りの数字が桁区切りとして誤っているか
+    3桁ごとの桁区切り（1,000）と、2桁以下の数字の列挙（図1,2、1,2,3）は正しいものとする
+    """
+    first, *rest = number.split(',')
+    if len(first) <= 3 and all(len(part) == 3 for part in rest):
+        return False
+    if len(first) <= 2 and all(len(part) <= 2 and not part.startswith('0') for part in rest):
+        return False
+    return True
+
+
+def check_numbers(text):
+    """
+    数値・単位の書式をチェックし、指摘事項の一覧を返す
+
+    >>> check_numbers('2024/10/17に1,000円を支払い、12:30に2,500円を受け取った')
+    []
+    >>> check_numbers('図1,2を参照。表1,2,3の値は1,000件')
+    []
+    >>> check_numbers('売上は1,00円、費用は12,0000円')
+    ['桁区切りの誤り: 「1,00」', '桁区切りの誤り: 「12,0000」']
+    >>> check_numbers('1,000円と2000円')
+    ['数値の書式: 桁区切りのカンマがある数値とない数値が混在しています']
+    >>> check_numbers('ISO 9001・JIS Z 8301準拠のABC2000は1,200円、規格ISO 14001')
+    []
+    >>> check_numbers('10 kgと5kg')
+    ['単位の書式: 数値と単位の間にスペースがある表記とない表記が混在しています']
+    """
+    findings = []
+    for match in COMMA_NUMBER_PATTERN.finditer(text):
+        if _is_invalid_grouping(match.group(0)):
+            findings.append(f"桁区切りの誤り: 「{match.group(0)}」")
+    if GROUPED_NUMBER_PATTERN.search(text) and UNGROUPED_NUMBER_PATTERN.search(STANDARD_NUMBER_PATTERN.sub(' ', text)):
+        findings.append("数値の書式: 桁区切りのカンマがある数値とない数値が混在しています")
+    if UNIT_WITH_SPACE_PATTERN.search(text) and UNIT_WITHOUT_SPACE_PATTERN.search(text):
+        findings.append("単位の書式: 数値と単位の間にスペースがある表記とない表記が混在しています")
+    return findings
+
+
+def check_text(text):
+    """テキストをルールでチェックし、指摘事項の一覧を返す"""
+    findings = []
+
+    # 全角/半角
+    for match in sorted(set(FULLWIDTH_ALNUM_PATTERN.findall(text))):
+        findings.append(f"全角英数字: 「{match}」→「{_fullwidth_to_halfwidth(match)}」")
+    for match in sorted(set(HALFWIDTH_KANA_PATTERN.findall(text))):
+        findings.append(f"半角カナ: 「{match}」は全角カナにしてください")
+
+    # 送り仮名
+    for wrong, right in OKURIGANA_RULES.items():
+        if wrong in text:
+            findings.append(f"送り仮名: 「{wrong}」→「{right}」")
+
+    # 表記ゆれ
+    for variants in NOTATION_VARIANTS:
+        used = [variant for variant, count in _count_variants(text, variants).items() if count]
+        if len(used) > 1:
+            findings.append(f"表記ゆれ: {'、'.join(f'「{v}」' for v in used)} が混在しています")
+
+    # 文字・語の重複
+    for match in REPEATED_PARTICLE_PATTERN.finditer(text):
+        findings.append(f"文字の重複: 「{match.group(0)}」")
+    for match in DUPLICATE_ASCII_WORD_PATTERN.finditer(text):
+        findings.append(f"語の重複: 「{match.group(0)}」")
+    for match in DUPLICATE_JAPANESE_WORD_PATTERN.finditer(text):
+        findings.append(f"語の重複: 「{match.group(0)}」→「{match.group(1)}」")
+
+    # 数値・単位の書式
+    findings.extend(check_numbers(text))
+
+    return findings
+
+
+def needs_llm_check(text, min_chars=10, min_letter_ratio=0.3):
+    """
+    AIによる校正が必要なページかどうかを判定
+    極端に短いページや、数字・記号が大半を占める表のようなページはルールチェックのみとする
+    """
+    content = re.sub(r'\s', '', text)
+    if len(content) < min_chars:
+        return False
+    letters = len(LETTER_PATTERN.findall(content))
+    return letters / len(content) >= min_letter_ratio
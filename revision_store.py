@@ -0,0 +1,47 @@
+"""
+改訂履歴モジュール
+文書ごとに前回の版のページ指紋と校正結果を保存し、差分校正で再利用する
+"""
+import os
+import json
+import hashlib
+from datetime import datetime
+
+
+class RevisionStore:
+    def __init__(self, folder):
+        self.folder = folder
+
+    def _path(self, document_key):
+        # 文書キー（ファイル名など）はハッシュ化してファイル名に使う
+        name = hashlib.sha256(document_key.encode('utf-8')).hexdigest()
+        return os.path.join(self.folder, f"{name}.json")
+
+    def load(self, document_key):
+        """前回の版のページ情報を取得（{ページ番号(str): {'fingerprint': ..., 'corrections': [...]}}）"""
+        path = self._path(document_key)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('pages', {})
+        except (OSError, ValueError) as e:
+            print(f"改訂履歴読み込みエラー: {e}")
+            return {}
+
+    def save(self, document_key, pages):
+        """今回の版のページ情報を保存"""
+        os.makedirs(self.folder, exist_ok=True)
+        path = self._path(document_key)
+        tmp_path = f"{path}.tmp"
+        data = {
+            'document_key': document_key,
+            'updated_at': datetime.now().isoformat(),
+            'pages': {str(page): info for page, info in pages.items()}
+        }
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"改訂履歴保存エラー: {e}")
@@ -0,0 +1,81 @@
+"""
+テキスト分割モジュール
+文字数の多いページのテキストを、段落・文（。！？）の境界でトークン数の上限内のチャンクに分割する
+前後のチャンクは一部を重複させ、境界をまたぐ誤りも検出できるようにする
+"""
+import re
+from page_batching import estimate_tokens
+
+# 段落（改行）または文末記号の直後で区切る
+SENTENCE_END_PATTERN = re.compile(r'[^\n。！？!?]*(?:[。！？!?]+|\n+|$)')
+
+
+def split_sentences(text):
+    """テキストを文単位に分割し、(開始位置, 終了位置)のリストを返す"""
+    spans = []
+    for match in SENTENCE_END_PATTERN.finditer(text):
+        if match.end() > match.start():
+            spans.append((match.start(), match.end()))
+    return spans
+
+
+def _split_long_span(text, start, end, token_budget):
+    """上限を超える1文を文字数で分割"""
+    spans = []
+    while start < end:
+        stop = start
+        tokens = 0
+        while stop < end and tokens + estimate_tokens(text[stop]) <= token_budget:
+            tokens += estimate_tokens(text[stop])
+            stop += 1
+        stop = max(stop, start + 1)
+        spans.append((start, stop))
+        start = stop
+    return spans
+
+
+def chunk_text(text, token_budget, overlap_tokens=0):
+    """
+    テキストをトークン数の上限内のチャンクに分割
+    戻り値は(開始位置, 終了位置, チャンクのテキスト)のリスト（位置はページ内の文字位置）
+    """
+    if estimate_tokens(text) <= token_budget:
+        return [(0, len(text), text)]
+
+    sentences = []
+    for start, end in split_sentences(text):
+        if estimate_tokens(text[start:end]) > token_budget:
+            sentences.extend(_split_long_span(text, start, end, token_budget))
+        else:
+            sentences.append((start, end))
+
+    chunks = []
+    index = 0
+    while index < len(sentences):
+        first = index
+        tokens = 0
+        while index < len(sentences):
+            sentence_tokens = estimate_tokens(text[sentences[index][0]:sentences[index][1]])
+            if index > first and tokens + sentence_tokens > token_budget:
+                break
+            tokens += sentence_tokens
+            index += 1
+
+        start, end = sentences[first][0], sentences[index - 1][1]
+        chunks.append((start, end, text[start:end]))
+        if index >= len(sentences):
+            break
+
+        # 次のチャンクは末尾の数文を重複させて始める
+        # （少なくとも1文は進め、重複部分と次の文が上限に収まる範囲に限る）
+        next_tokens = estimate_tokens(text[sentences[index][0]:sentences[index][1]])
+        overlap = 0
+        back = index
+        while back - 1 > first:
+            previous_tokens = estimate_tokens(text[sentences[back - 1][0]:sentences[back - 1][1]])
+            if overlap + previous_tokens > overlap_tokens or overlap + previous_tokens + next_tokens > token_budget:
+                break
+            back -= 1
+            overlap += previous_tokens
+        index = back
+    return chunks
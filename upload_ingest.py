@@ -0,0 +1,123 @@
+"""
+アップロードの受け付けモジュール
+リクエストボディのファイル部分をチャンクごとに直接ディスクへ書き込みながらSHA-256を計算し、
+サイズの上限を超えた時点で受信を打ち切る
+受信後はPDFの先頭・末尾・暗号化・ページ数を軽く確認し、校正処理に渡す前に不正なファイルを拒否する
+"""
+import os
+import uuid
+import hashlib
+import fitz  # PyMuPDF
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+from config import Config
+
+# 先頭・末尾の確認で読み込むバイト数
+PDF_HEADER_BYTES = 1024
+PDF_TRAILER_BYTES = 2048
+
+
+class UploadRejected(Exception):
+    """受け付けられないアップロード（messageは画面に表示するエラー）"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class HashingFileStream:
+    """受信したデータをファイルに書き込みながらSHA-256とサイズを計算するストリーム"""
+    def __init__(self, path, max_bytes=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.file = open(path, 'w+b')
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise RequestEntityTooLarge()
+        self.digest.update(data)
+        return self.file.write(data)
+
+    @property
+    def sha256(self):
+        return self.digest.hexdigest()
+
+    def read(self, *args):
+        return self.file.read(*args)
+
+    def readline(self, *args):
+        return self.file.readline(*args)
+
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def tell(self):
+        return self.file.tell()
+
+    def flush(self):
+        return self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def discard(self):
+        """ファイルを削除（保存先に移動済みの場合は何もしない）"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class IngestRequest(Request):
+    """アップロードされたファイルを一時ファイルを経由せずUPLOAD_FOLDERに直接書き込むリクエスト"""
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+        path = os.path.join(Config.UPLOAD_FOLDER, f"incoming_{uuid.uuid4().hex}.pdf")
+        stream = HashingFileStream(path, Config.MAX_CONTENT_LENGTH)
+        if not hasattr(self, 'upload_streams'):
+            self.upload_streams = []
+        self.upload_streams.append(stream)
+        return stream
+
+    def discard_uploads(self):
+        """受信したファイルのうち、保存先に移動しなかったものを削除"""
+        for stream in getattr(self, 'upload_streams', []):
+            stream.discard()
+
+
+def inspect_pdf(path, max_pages=0):
+    """
+    PDFとして処理できるか確認し、ページ数を返す（できない場合はUploadRejected）
+    ヘッダーを確認してから、PyMuPDFで相互参照表だけを読み込んで暗号化とページ数を確認する
+    末尾にstartxrefと%%EOFがない場合（末尾に余分なデータがあるPDFなど）も、PyMuPDFで開ければ受け付ける
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.read(PDF_HEADER_BYTES)
+        f.seek(max(0, size - PDF_TRAILER_BYTES))
+        trailer = f.read()
+    if b'%PDF-' not in header:
+        raise UploadRejected('PDFファイルではありません')
+    has_trailer = b'startxref' in trailer and b'%%EOF' in trailer
+
+    try:
+        doc = fitz.open(path)
+    except Exception as e:
+        print(f"PDF確認エラー: {e}")
+        if not has_trailer:
+            raise UploadRejected('PDFファイルが破損しているか、最後まで送信されていません')
+        raise UploadRejected('PDFファイルを開けません')
+    try:
+        if doc.needs_pass:
+            raise UploadRejected('パスワードで保護されたPDFは処理できません')
+        page_count = doc.page_count
+    finally:
+        doc.close()
+    if page_count == 0:
+        raise UploadRejected('ページのないPDFです')
+    if max_pages > 0 and page_count > max_pages:
+        raise UploadRejected(f'ページ数が多すぎます（{page_count}ページ、最大{max_pages}ページ）', 413)
+    return page_count